@@ -0,0 +1,84 @@
+"""
+Synthetic layouts used by the benchmarks.
+
+Every function takes a :class:`~boxes.context.Context` and a size, constrains
+a layout in it, and returns ``(figure, boxes)`` where *figure* is the box
+passed to :func:`boxes.display.display` and *boxes* are the boxes drawn in it.
+Every layout is fully determined once ``figure.solve()`` is called.
+"""
+
+from boxes import constrain
+
+
+def grid(ctx, n):
+  """An *n* by *n* grid built from :func:`~boxes.constrain.row` and
+  :func:`~boxes.constrain.column`."""
+  cells = [[ctx.box(size=(1, 0.5)) for _ in range(n)] for _ in range(n)]
+  rows = [constrain.row(*row, spacing=0.1) for row in cells]
+  figure = constrain.column(*rows, spacing=0.1)
+  return figure, [box for row in cells for box in row]
+
+
+def table(ctx, n):
+  """An *n* by *n* table built with :func:`~boxes.constrain.grid`. Revisions
+  without it build the same table from rows and columns, so they can still be
+  compared."""
+  if not hasattr(constrain, 'grid'):
+    return grid(ctx, n)
+  cells = [[ctx.box(size=(1, 0.5)) for _ in range(n)] for _ in range(n)]
+  figure = constrain.grid(cells, spacing=0.1)
+  return figure, [box for row in cells for box in row]
+
+
+def nested(ctx, n):
+  """*n* boxes nested inside each other using :func:`~boxes.box.Box.pad`."""
+  outer = ctx.box(size=(2 * n + 1, n + 1))
+  boxes = [outer]
+  for _ in range(n - 1):
+    inner = ctx.box()
+    boxes[-1].pad(0.5, 1).fix(inner)
+    boxes.append(inner)
+  return outer, boxes
+
+
+def chain(ctx, n):
+  """A single :func:`~boxes.constrain.hcat` chain of *n* boxes."""
+  boxes = [ctx.box(size=(1, 1)) for _ in range(n)]
+  constrain.hcat(*boxes, spacing=0.1)
+  constrain.align('t', *boxes)
+  figure = ctx.box(
+      top=boxes[0].top, left=boxes[0].left,
+      bottom=boxes[0].bottom, right=boxes[-1].right,
+  )
+  return figure, boxes
+
+
+def gallery(ctx, n, per_row=8):
+  """*n* images with varying :func:`~boxes.constrain.aspect` ratios, filling
+  rows of a fixed width."""
+  boxes = [ctx.box(aspect=1 + (i * 7 % 5) / 4) for i in range(n)]
+  rows = []
+  for i in range(0, n, per_row):
+    row = constrain.row(*boxes[i:i + per_row], spacing=0.1)
+    constrain.width(20, row)
+    rows.append(row)
+  figure = constrain.column(*rows, spacing=0.1)
+  return figure, boxes
+
+
+layouts = {
+    'grid': grid,
+    'table': table,
+    'nested': nested,
+    'chain': chain,
+    'gallery': gallery,
+}
+
+# The size of every layout at scale 1, chosen so each takes a similar time.
+sizes = {
+    'grid': 30,
+    'table': 30,
+    'nested': 300,
+    'chain': 2000,
+    'gallery': 1000,
+}
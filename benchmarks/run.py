@@ -0,0 +1,209 @@
+"""
+Benchmark the phases of building and solving synthetic layouts.
+
+Usage::
+
+  python benchmarks/run.py [--scale S] [--engine E] [--json FILE] [LAYOUT ...]
+  python benchmarks/run.py --compare REV_A REV_B [options] [LAYOUT ...]
+
+For every layout in :mod:`layouts` the time and peak memory (as seen by
+:mod:`tracemalloc`, on top of what was allocated before the phase) is reported
+separately for
+
+* *build* --- creating the boxes and constraints,
+* *solve* --- calling ``figure.solve()``,
+* *read* --- reading the edges of every box (ten times),
+* *display* --- rendering with :func:`boxes.display.display`.
+
+A phase which fails (e.g. because the engine does not exist in a revision being
+compared) is reported as ``-``, and so are the phases after it.
+
+With ``--compare`` the benchmarks are run against the ``src`` directory of two
+git revisions (exported with ``git archive``) and the timings are shown side by
+side.
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+phases = ['build', 'solve', 'read', 'display']
+engines = ['eager', 'deferred', 'markowitz', 'sparse']
+
+
+def make_context(engine):
+  from boxes import Context
+  if engine == 'deferred':
+    return Context(deferred=True)
+  if engine == 'markowitz':
+    import symmath
+    return Context(system=symmath.System(deferred=True, pivot='markowitz'))
+  if engine == 'sparse':
+    import symmath
+    return Context(system=symmath.SparseSystem())
+  return Context()
+
+
+def run_phases(name, size, engine, out):
+  """Run every phase of a layout, yielding (phase, seconds) pairs."""
+  import layouts
+  from boxes.display import display
+
+  def build():
+    ctx = make_context(engine)
+    state['figure'], state['boxes'] = layouts.layouts[name](ctx, size)
+
+  def solve():
+    state['figure'].solve()
+
+  def read():
+    for _ in range(10):
+      for box in state['boxes']:
+        box.top, box.right, box.bottom, box.left
+
+  def render():
+    display(out, state['figure'], state['boxes'])
+
+  state = {}
+  failed = False
+  for phase, f in zip(phases, [build, solve, read, render]):
+    if failed:
+      # The later phases need the result of the failed one.
+      yield phase, None
+      continue
+    gc.collect()
+    start = time.perf_counter()
+    try:
+      f()
+    except Exception as e:
+      # E.g. cairo is missing, or an older revision (see --compare) lacks
+      # the engine or a function used by the layout.
+      print('{} ({}): {} failed: {!r}'.format(name, engine, phase, e),
+            file=sys.stderr)
+      failed = phase != 'display'
+      yield phase, None
+      continue
+    yield phase, time.perf_counter() - start
+
+
+def measure(name, size, engine, memory):
+  """Return a dictionary mapping each phase to its time and peak memory."""
+  result = {}
+  with tempfile.TemporaryDirectory() as tmp:
+    out = os.path.join(tmp, 'layout.svg')
+    for phase, seconds in run_phases(name, size, engine, out):
+      result[phase] = {'time': seconds}
+    if memory:
+      tracemalloc.start()
+      base = 0
+      for phase, seconds in run_phases(name, size, engine, out):
+        _, peak = tracemalloc.get_traced_memory()
+        result[phase]['peak'] = peak - base if seconds is not None else None
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+  return result
+
+
+def run(args):
+  import layouts
+  if args.engine == 'sparse':
+    # Import scipy up front so it is not counted as part of any phase.
+    import scipy.sparse.linalg
+  results = {}
+  for name in args.layouts or list(layouts.layouts):
+    size = max(1, int(layouts.sizes[name] * args.scale))
+    results[name] = measure(name, size, args.engine, not args.no_memory)
+    results[name]['size'] = size
+  return results
+
+
+def format_time(seconds):
+  return '-' if seconds is None else '{:.4f}s'.format(seconds)
+
+
+def format_memory(peak):
+  return '-' if peak is None else '{:.1f}MB'.format(peak / 1e6)
+
+
+def report(results):
+  print('{:<10} {:>6} {:<8} {:>10} {:>10}'.format(
+      'layout', 'size', 'phase', 'time', 'peak'))
+  for name, result in results.items():
+    for phase in phases:
+      print('{:<10} {:>6} {:<8} {:>10} {:>10}'.format(
+          name, result['size'], phase,
+          format_time(result[phase]['time']),
+          format_memory(result[phase].get('peak')),
+      ))
+
+
+def run_revision(rev, args, tmp):
+  """Run the benchmarks in a subprocess against *rev* and return the
+  results."""
+  src = os.path.join(tmp, rev.replace('/', '_'))
+  os.makedirs(src)
+  archive = subprocess.run(
+      ['git', 'archive', rev, 'src'], check=True, stdout=subprocess.PIPE)
+  subprocess.run(['tar', '-x', '-C', src], input=archive.stdout, check=True)
+  out = os.path.join(tmp, 'results.json')
+  command = [
+      sys.executable, os.path.abspath(__file__), '--json', out,
+      '--scale', str(args.scale), '--engine', args.engine,
+  ]
+  if args.no_memory:
+    command.append('--no-memory')
+  env = dict(os.environ, PYTHONPATH=os.path.join(src, 'src'))
+  subprocess.run(command + args.layouts, check=True, env=env,
+                 stdout=subprocess.DEVNULL)
+  with open(out) as f:
+    return json.load(f)
+
+
+def compare(args):
+  with tempfile.TemporaryDirectory() as tmp:
+    a, b = (run_revision(rev, args, tmp) for rev in args.compare)
+  print('{:<10} {:<8} {:>10} {:>10} {:>8}'.format(
+      'layout', 'phase', args.compare[0][:10], args.compare[1][:10], 'ratio'))
+  for name in a:
+    for phase in phases:
+      ta, tb = a[name][phase]['time'], b[name][phase]['time']
+      ratio = '-' if not ta or tb is None else '{:.2f}x'.format(tb / ta)
+      print('{:<10} {:<8} {:>10} {:>10} {:>8}'.format(
+          name, phase, format_time(ta), format_time(tb), ratio))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+  parser.add_argument('layouts', nargs='*', help='layouts to run (all)')
+  parser.add_argument('--scale', type=float, default=1,
+                      help='multiply the size of every layout')
+  parser.add_argument('--engine', choices=engines, default='eager',
+                      help='how the contexts are created')
+  parser.add_argument('--no-memory', action='store_true',
+                      help='skip the (slower) peak memory measurement')
+  parser.add_argument('--json', help='write the results to this file')
+  parser.add_argument('--compare', nargs=2, metavar='REV',
+                      help='compare two git revisions')
+  args = parser.parse_args()
+  if args.compare:
+    compare(args)
+    return
+  results = run(args)
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump(results, f, indent=2)
+  else:
+    report(results)
+
+
+if __name__ == '__main__':
+  main()
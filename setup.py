@@ -13,5 +13,6 @@ setup(
     zip_safe=True,
     extras_require = {
         'Simple rendering of boxes':  ['pycairo'],
+        'Sparse solving and box arrays':  ['numpy', 'scipy'],
     },
 )
@@ -8,9 +8,11 @@ Convenience reexports. Typing ``from boxes import *`` imports the following:
   library.
 * The module :mod:`~boxes.constrain` which contains a bunch of convenient
   constraints.
+* The function :func:`~boxes.context.solve_many` which solves many contexts in
+  parallel.
 
 """
-from boxes.context import Context
+from boxes.context import Context, solve_many
 from boxes import constrain
 
-__all__ = ['Context', 'constrain']
+__all__ = ['Context', 'constrain', 'solve_many']
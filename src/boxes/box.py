@@ -57,8 +57,10 @@ class Box:
   def __init__(self, context, rect=None, aspect=None, **kwargs):
     self.context = context
     if rect is None:
+      context._register(self, context.num_symbols)
       rect = Rect(*(context.sym() for _ in range(4)))
     self._rect = rect
+    self._solved = (None, None)
 
     for k, v in kwargs.items():
       if k in self._rect_attrs:
@@ -84,7 +86,12 @@ class Box:
 
     """
     if self.context.is_solved:
-      return self.context.system.eval(self._rect)
+      values, rect = self._solved
+      if values is not self.context.values:
+        values = self.context.values
+        rect = self.context.eval(self._rect)
+        self._solved = values, rect
+      return rect
     return self._rect
 
   def solve(self, fix_upper_left=True):
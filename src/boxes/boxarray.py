@@ -0,0 +1,208 @@
+"""
+boxes.boxarray
+--------------
+
+.. autoclass:: BoxArray
+  :members:
+
+"""
+
+import symmath
+from boxes.box import Box
+from boxes.cartesian import Rect, Vect
+
+
+class BoxArray:
+  """
+
+    A sequence of *n* boxes whose rectangles occupy a contiguous block of
+    symbols in the context. Constraints can be applied to all the boxes at once,
+    and once the context is solved the edges are available as NumPy arrays
+    without creating a :class:`~boxes.box.Box` object per element. Indexing
+    and iterating still gives regular :class:`~boxes.box.Box` objects.
+
+    Use :meth:`boxes.context.Context.boxes` to construct instances. Keyword
+    arguments are passed on to :func:`equate`.
+
+    >>> from boxes import *
+    >>> ctx = Context()
+    >>> bars = ctx.boxes(3, width=1, height=[1, 3, 2], bottom=0)
+    >>> bars.hcat(spacing=0.5)
+    >>> ctx.equate(bars[0].left, 0)
+    >>> ctx.solve()
+    >>> bars.left
+    array([0. , 1.5, 3. ])
+    >>> bars.top
+    array([-1., -3., -2.])
+    >>> print(bars[1].loc)
+    (1.5, -3.0)
+
+    .. attribute:: context
+
+      The :class:`~boxes.context.Context` of the boxes.
+
+    .. attribute:: start
+
+      The first symbol used by the boxes. The edges of box *i* are the symbols
+      ``start + 4 * i + k``, where *k* is 0, 1, 2, and 3 for the top, right,
+      bottom, and left edge.
+
+  """
+
+  def __init__(self, context, start, n, aspect=None, **kwargs):
+    self.context = context
+    self.start = start
+    context._register(self, start)
+    self._len = n
+    self._boxes = [None] * n
+    for attr, values in kwargs.items():
+      self.equate(attr, values)
+    if aspect is not None:
+      self.context.equate(
+          self._exprs('width'),
+          [h * a for h, a in zip(self._exprs('height'), self._per_box(aspect))],
+      )
+
+  def __len__(self):
+    return self._len
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self[j] for j in range(*i.indices(self._len))]
+    if i < 0:
+      i += self._len
+    if not 0 <= i < self._len:
+      raise IndexError('BoxArray index out of range')
+    box = self._boxes[i]
+    if box is None:
+      n = self.start + 4 * i
+      rect = Rect(*(symmath.sym(n + k) for k in range(4)))
+      box = self._boxes[i] = Box(self.context, rect=rect)
+    return box
+
+  def __iter__(self):
+    for i in range(self._len):
+      yield self[i]
+
+  def _per_box(self, value, pairs=False):
+    """
+    Return a list with a value for every box. If *pairs* is true, the values
+    themselves are sequences (e.g. a size).
+    """
+    per_box = _is_sequence(value) and (
+        not pairs or (len(value) > 0 and _is_sequence(value[0])))
+    if not per_box:
+      return [value] * self._len
+    if len(value) != self._len:
+      raise ValueError(
+          'Expected {} values, got {}'.format(self._len, len(value)))
+    return list(value)
+
+  def _exprs(self, attr):
+    """Return a list with the given property of every box."""
+    def edge(name):
+      n = self.start + _edges[name]
+      return [symmath.sym(n + 4 * i) for i in range(self._len)]
+    if attr in _edges:
+      return edge(attr)
+    if attr == 'width':
+      return [r - l for r, l in zip(edge('right'), edge('left'))]
+    if attr == 'height':
+      return [b - t for b, t in zip(edge('bottom'), edge('top'))]
+    if attr == 'loc':
+      return [Vect(l, t) for l, t in zip(edge('left'), edge('top'))]
+    if attr == 'size':
+      return [Vect(w, h)
+              for w, h in zip(self._exprs('width'), self._exprs('height'))]
+    raise AttributeError(attr)
+
+  def equate(self, attr, values):
+    """
+
+      Constrain the property *attr* (any property of
+      :class:`~boxes.cartesian.Rect`) of every box. *values* is either a single
+      value used for every box, or a sequence with a value per box.
+
+    """
+    if attr not in Box._rect_attrs:
+      raise TypeError('Unknown box property: {}'.format(repr(attr)))
+    pairs = attr in ('loc', 'size')
+    self.context.equate(self._exprs(attr), self._per_box(values, pairs))
+
+  def hcat(self, spacing=0):
+    """
+      Like :func:`boxes.constrain.hcat`. *spacing* can also be a sequence with
+      a spacing for every pair of neighbouring boxes.
+    """
+    right = self._exprs('right')
+    left = self._exprs('left')
+    spacing = _per_pair(spacing, len(right) - 1)
+    self.context.equate(
+        [r + s for r, s in zip(right[:-1], spacing)], left[1:])
+
+  def vcat(self, spacing=0):
+    """
+      Like :func:`boxes.constrain.vcat`. *spacing* can also be a sequence with
+      a spacing for every pair of neighbouring boxes.
+    """
+    bottom = self._exprs('bottom')
+    top = self._exprs('top')
+    spacing = _per_pair(spacing, len(top) - 1)
+    self.context.equate(
+        [b + s for b, s in zip(bottom[:-1], spacing)], top[1:])
+
+  def align(self, edges):
+    """
+      Like :func:`boxes.constrain.align`.
+    """
+    if not self._len:
+      return
+    for e in edges:
+      exprs = self._exprs(_letters[e])
+      self.context.equate(exprs[1:], [exprs[0]] * (self._len - 1))
+
+  def _values(self):
+    import numpy
+    values = numpy.frombuffer(self.context.values, dtype=float)
+    # The edges are a view of the solved values, which must not be changed
+    # through it.
+    values.flags.writeable = False
+    n = self.start
+    return values[n:n + 4 * self._len].reshape(self._len, 4)
+
+  def _edge(attr):
+    def get(self):
+      if not self.context.is_solved:
+        return self._exprs(attr)
+      values = self._values()
+      top, right, bottom, left = (values[:, k] for k in range(4))
+      return {
+          'top': top, 'right': right, 'bottom': bottom, 'left': left,
+          'width': right - left, 'height': bottom - top,
+      }[attr]
+    get.__doc__ = (
+        'The {} of every box. A :class:`numpy.ndarray` once the context is '
+        'solved, otherwise a list of expressions.'.format(attr))
+    return property(get)
+
+  top = _edge('top')
+  right = _edge('right')
+  bottom = _edge('bottom')
+  left = _edge('left')
+  width = _edge('width')
+  height = _edge('height')
+  del _edge
+
+
+_edges = {'top': 0, 'right': 1, 'bottom': 2, 'left': 3}
+_letters = {'t': 'top', 'r': 'right', 'b': 'bottom', 'l': 'left'}
+
+
+def _is_sequence(value):
+  return isinstance(value, (list, tuple)) or hasattr(value, '__array__')
+
+
+def _per_pair(spacing, n):
+  if _is_sequence(spacing):
+    return list(spacing)
+  return [spacing] * n
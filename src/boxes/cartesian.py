@@ -24,6 +24,8 @@ class Vect(namedtuple('Vect', 'x y')):
 
   """
 
+  __slots__ = ()
+
   def __add__(self, other):
     return Vect(u + v for u, v in zip(self, other))
 
@@ -89,17 +91,41 @@ class Rect:
 
       The size of the rectangle (as a :class:`Vect`).
 
+    Only the edges are stored when a rectangle is created. The other
+    attributes are computed when they are first read, and then cached.
+
   """
 
+  __slots__ = (
+      'top', 'right', 'bottom', 'left', '_width', '_height', '_loc', '_size')
+
   def __init__(self, top, right, bottom, left):
-    width = right - left
-    height = bottom - top
-    self.__dict__.update(
-        top=top, right=right, bottom=bottom, left=left,
-        width=width, height=height,
-        loc=Vect(left, top),
-        size=Vect(width, height),
-    )
+    setattr = object.__setattr__
+    setattr(self, 'top', top)
+    setattr(self, 'right', right)
+    setattr(self, 'bottom', bottom)
+    setattr(self, 'left', left)
+
+  def _cached(name, compute):
+    slot = '_' + name
+
+    def get(self):
+      try:
+        return getattr(self, slot)
+      except AttributeError:
+        value = compute(self)
+        object.__setattr__(self, slot, value)
+        return value
+    return property(get)
+
+  width = _cached('width', lambda self: self.right - self.left)
+  height = _cached('height', lambda self: self.bottom - self.top)
+  loc = _cached('loc', lambda self: Vect(self.left, self.top))
+  size = _cached('size', lambda self: Vect(self.width, self.height))
+  del _cached
+
+  def __reduce__(self):
+    return Rect, (self.top, self.right, self.bottom, self.left)
 
   def _symmath_eval(self, f):
     return Rect(
@@ -117,3 +143,6 @@ class Rect:
 
   def __setattr__(self, attr, val):
     raise TypeError("'Rect' objects are immutable")
+
+  def __delattr__(self, attr):
+    raise TypeError("'Rect' objects are immutable")
@@ -6,12 +6,14 @@ boxes.constrain
   align
   row
   column
+  grid
   hcat
   vcat
   aspect
   width
   height
   size
+  fit_text
 
 """
 
@@ -103,6 +105,70 @@ def column(*boxes, spacing=0):
   return _bbox(boxes)
 
 
+@public
+def grid(rows, spacing=0, row_spacing=None, column_spacing=None):
+  """
+
+    Place boxes in a table. Every box in a row gets the same top and bottom
+    edges, and every box in a column gets the same left and right edges. This
+    is similar to putting a :func:`row` for every row of boxes in a
+    :func:`column`, but each row and each column only gets two symbols for its
+    edges, no bounding box is created for the rows, and all the constraints
+    are added to the context in a single call. The number of equations is
+    about the same, though, so building and solving a large table takes
+    roughly as long as with rows and columns.
+
+    :arg rows:
+      A sequence of rows, each of which is a sequence of
+      :class:`~boxes.box.Box` objects. Use ``None`` to leave a cell empty. All
+      rows should have the same length.
+    :arg spacing:
+      The spacing between rows and between columns.
+    :arg row_spacing:
+      The spacing between rows, if different from *spacing*.
+    :arg column_spacing:
+      The spacing between columns, if different from *spacing*.
+    :returns:
+      The bounding :class:`~boxes.box.Box` of the table.
+
+    >>> from boxes import *
+    >>> ctx = Context()
+    >>> a, b, c = ctx.box(size=(3, 1)), ctx.box(width=1), ctx.box(height=2)
+    >>> table = constrain.grid([[a, b], [None, c]], spacing=0.5)
+    >>> table.solve()
+    >>> print(table.size, c.loc)
+    (4.5, 3.5) (3.5, 1.5)
+
+  """
+  rows = [list(row) for row in rows]
+  if row_spacing is None:
+    row_spacing = spacing
+  if column_spacing is None:
+    column_spacing = spacing
+  num_columns = max(len(row) for row in rows)
+  context = next(box for row in rows for box in row if box is not None).context
+  tops = [context.sym() for _ in rows]
+  bottoms = [context.sym() for _ in rows]
+  lefts = [context.sym() for _ in range(num_columns)]
+  rights = [context.sym() for _ in range(num_columns)]
+
+  lhs = [bottom + row_spacing for bottom in bottoms[:-1]]
+  rhs = tops[1:]
+  lhs.extend(right + column_spacing for right in rights[:-1])
+  rhs.extend(lefts[1:])
+  for i, row in enumerate(rows):
+    for j, box in enumerate(row):
+      if box is not None:
+        lhs.append(box.rect)
+        rhs.append(Rect(tops[i], rights[j], bottoms[i], lefts[j]))
+  context.equate(lhs, rhs)
+
+  return Box(
+      context=context,
+      rect=Rect(tops[0], rights[-1], bottoms[-1], lefts[0]),
+  )
+
+
 @public
 def hcat(*boxes, spacing=0):
   """
@@ -203,6 +269,40 @@ def size(size, *boxes):
     box.context.equate(box.size, size)
 
 
+@public
+def fit_text(text, *boxes, font=None, padding=0):
+  """
+
+    Constrain the size of every box in *boxes* to the size of *text* (as
+    measured by :func:`boxes.text.measure`) plus *padding* on every side.
+
+    :arg str text:
+      The text the boxes should fit.
+    :arg boxes:
+      :class:`~boxes.box.Box` objects.
+    :arg boxes.text.Font font:
+      The font of the text, by default :class:`boxes.text.Font()
+      <boxes.text.Font>`.
+    :arg padding:
+      A :class:`float` or an :class:`~symmath.expr.Expr` object.
+
+    >>> from boxes import *
+    >>> from boxes.text import Font, measure
+    >>> ctx = Context()
+    >>> label = ctx.box()
+    >>> constrain.fit_text('Mean', label, font=Font(size=10), padding=1)
+    >>> label.solve()
+    >>> label.width == measure('Mean', Font(size=10)).x + 2
+    True
+
+  """
+  from boxes import text as _text
+  if font is None:
+    font = _text.Font()
+  width, height = _text.measure(text, font)
+  size(Vect(width + 2 * padding, height + 2 * padding), *boxes)
+
+
 def _pairs(xs):
   return zip(xs[:-1], xs[1:])
 
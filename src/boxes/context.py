@@ -2,17 +2,38 @@
 boxes.context
 -------------
 
-.. autoclass:: Context()
+.. autoclass:: Context(system=None, deferred=False, cache=None)
   :members:
+
+.. autofunction:: solve_many
+.. autoexception:: UnderdeterminedError
 """
 
+import array
+import bisect
+import contextlib
+import sys
 import symmath
 import boxes.box
+import boxes.boxarray
 
 
 class Context:
   """
 
+    :arg symmath.system.System system:
+      The system used to hold the equations. By default a new
+      :class:`~symmath.system.System` is created, but another engine such as
+      :class:`~symmath.sparse.SparseSystem` can be passed instead.
+    :arg bool deferred:
+      If true (and *system* is not given), constraints are only recorded when
+      they are added, and all of them are solved in one batch by
+      :func:`solve`. See :class:`~symmath.system.System`.
+    :arg symmath.sparse.FactorCache cache:
+      If given (and *system* is not), the context uses a
+      :class:`~symmath.sparse.SparseSystem` with this cache, so contexts
+      sharing the cache skip the factorization of layouts they have in common.
+
     .. attribute:: system
 
       The underlying :class:`~symmath.system.System` holding all equations
@@ -22,30 +43,345 @@ class Context:
 
       A :class:`bool` indicating whether :func:`solve` has been called.
 
+    .. attribute:: values
+
+      After :func:`solve` has been called, this is a flat array (of type
+      :class:`array.array`) holding the value of every symbol created by
+      :func:`sym`, indexed by symbol. Otherwise it is ``None``.
+
+    .. attribute:: parameters
+
+      The list of symbols created by :func:`param`, in the order used for the
+      parameter vectors of :func:`compile`.
+
   """
 
-  def __init__(self):
-    self.system = symmath.System()
+  def __init__(self, system=None, deferred=False, cache=None):
+    if system is not None and cache is not None:
+      raise ValueError('A cache can only be used without a system')
+    if cache is not None:
+      system = symmath.SparseSystem(cache=cache)
+    elif system is None:
+      system = symmath.System(deferred=deferred)
+    self.system = system
     self.num_symbols = 0
     self.is_solved = False
+    self.values = None
+    self.parameters = []
+    self._checkpoints = []
+    # The first symbol of every box and box array, in the order they were
+    # created, so free symbols can be traced back to their owners.
+    self._owner_starts = []
+    self._owners = []
+
+  @property
+  def tracer(self):
+    """
+
+      A :class:`~symmath.trace.Tracer` recording the constraints added to this
+      context and the calls to :func:`solve`, or ``None`` (the default). This
+      is the same as the :attr:`~symmath.system.System.tracer` of
+      :attr:`system`.
+
+      Every constraint is recorded as a span named after the function in
+      :mod:`boxes.constrain` which added it (the outermost one, e.g.
+      ``constrain.row`` rather than ``constrain.hcat``), containing the span
+      of the :func:`~symmath.system.System.equate` call.
+
+      >>> from boxes import *
+      >>> from symmath import Tracer
+      >>> ctx = Context()
+      >>> ctx.tracer = Tracer()
+      >>> a, b = ctx.box(), ctx.box()
+      >>> fig = constrain.row(a, b)
+      >>> sorted({event['name'] for event in ctx.tracer.events})
+      ['constrain.row', 'equate']
+
+    """
+    return self.system.tracer
+
+  @tracer.setter
+  def tracer(self, tracer):
+    self.system.tracer = tracer
 
   def equate(self, x, y):
     """
       Add a constraint setting *x == y*.
     """
-    self.system.equate(x, y)
+    tracer = self.system.tracer
+    if tracer is None:
+      self.system.equate(x, y)
+      return
+    with tracer.span(_constraint_name(), cat='boxes'):
+      self.system.equate(x, y)
 
   def solve(self):
     """
 
-      Solve the layout. This function raises an error if the layout is not fully
-      defined.
+      Solve the layout. This function raises :exc:`UnderdeterminedError` if
+      the layout is not fully defined. Layouts with :attr:`parameters` cannot
+      be solved, use :func:`compile` instead.
 
     """
-    for n in range(self.num_symbols):
-      assert n in self.system.facts
+    tracer = self.system.tracer
+    if tracer is None:
+      self._solve()
+      return
+    with tracer.span('Context.solve', cat='boxes'):
+      self._solve()
+
+  def _solve(self):
+    if self.parameters:
+      raise symmath.SymmathError(
+          'Layouts with parameters must be compiled instead')
+    self.system.solve()
+    facts = self.system.facts
+    if len(facts) < self.num_symbols:
+      raise self._underdetermined()
+    try:
+      self.values = array.array(
+          'd', (facts[n].scalar() for n in range(self.num_symbols)))
+    except KeyError:
+      # The system also holds facts about symbols of another context.
+      raise self._underdetermined() from None
     self.is_solved = True
 
+  def eval(self, val):
+    """
+
+      Evaluate *val* using the solved :attr:`values`. This is equivalent to
+      ``self.system.eval(val)``, but only costs a lookup per symbol.
+      Structures supporting :func:`~symmath.system.System.eval` are supported
+      here as well.
+
+    """
+    if hasattr(val, '_symmath_eval'):
+      return val._symmath_eval(self.eval)
+    if not isinstance(val, symmath.Expr):
+      return val
+    values = self.values
+    total = 0.0
+    try:
+      for symbol, coef in val.terms.items():
+        if symbol is None:
+          total += coef
+        else:
+          total += coef * values[symbol]
+    except (IndexError, TypeError):
+      # Not a symbol created by this context.
+      return self.system.eval(val)
+    return total
+
+  def compile(self, val=None):
+    """
+
+      Solve the layout in terms of its :attr:`parameters`, and return a
+      :class:`~symmath.affine.AffineMap` evaluating *val* for given parameter
+      values. *val* is typically a list of :attr:`~boxes.box.Box.rect`
+      properties. If *val* is not given, the map returns the values of all
+      symbols as an array. This method requires :mod:`numpy`.
+
+      The map can evaluate a whole batch of parameter vectors at once, in which
+      case every number in the result becomes an array.
+
+      >>> from boxes import *
+      >>> ctx = Context()
+      >>> width = ctx.param()
+      >>> fig = ctx.box(width=width)
+      >>> square = ctx.box(aspect=1)
+      >>> fig.pad(1).fix(square)
+      >>> ctx.equate(fig.loc, (0, 0))
+      >>> layout = ctx.compile([fig.rect, square.rect])
+      >>> fig_rect, square_rect = layout([10])
+      >>> print(fig_rect.size, square_rect.loc)
+      (10.0, 10.0) (1.0, 1.0)
+      >>> fig_rect, square_rect = layout([[4], [6]])
+      >>> square_rect.width
+      array([2., 4.])
+
+    """
+    self.system.solve()
+    if len(self.system.facts) + len(self.parameters) < self.num_symbols:
+      raise self._underdetermined()
+    structure = val
+    if val is None:
+      val = [symmath.sym(n) for n in range(self.num_symbols)]
+    rval = symmath.AffineMap.from_system(self.system, self.parameters, val)
+    if structure is None:
+      rval.structure = None
+    return rval
+
+  def stats(self, reset=False):
+    """
+
+      Return a dictionary summarizing the layout and the work done by
+      :attr:`system` (see :class:`symmath.system.Stats`). In addition to the
+      counters of the system, the dictionary contains:
+
+      * ``symbols`` --- the number of symbols allocated by :func:`sym`.
+      * ``eliminated`` --- the number of symbols eliminated by the system.
+      * ``free`` --- the number of symbols which are neither eliminated nor
+        :attr:`parameters`.
+      * ``fact_terms`` and ``max_fact_terms`` --- the total number of terms in
+        the facts of the system and the number of terms of the largest fact.
+
+      If *reset* is true, the counters are reset after reading them.
+
+      >>> from boxes import *
+      >>> ctx = Context()
+      >>> box = ctx.box(size=(2, 1))
+      >>> stats = ctx.stats()
+      >>> stats['symbols'], stats['eliminated'], stats['free']
+      (4, 2, 2)
+
+    """
+    rval = self.system.stats.as_dict()
+    eliminated = len(self.system.facts)
+    rval['fact_terms'], rval['max_fact_terms'] = self.system.fact_size()
+    rval.update(
+        symbols=self.num_symbols,
+        eliminated=eliminated,
+        free=self.num_symbols - eliminated - len(self.parameters),
+    )
+    if reset:
+      self.system.stats.reset()
+    return rval
+
+  def free_symbols(self):
+    """
+
+      Return the symbols which are neither eliminated nor :attr:`parameters`,
+      as a list of ``(symbol, box, edge)`` tuples. *box* is the
+      :class:`~boxes.box.Box` owning the symbol and *edge* is the name of the
+      edge it represents (e.g. ``'left'``), or both are ``None`` for symbols
+      not owned by a box (such as the row positions of
+      :func:`~boxes.constrain.grid`).
+
+      >>> from boxes import *
+      >>> ctx = Context()
+      >>> box = ctx.box(width=2, top=0)
+      >>> [(edge, owner is box) for _, owner, edge in ctx.free_symbols()]
+      [('bottom', True), ('left', True)]
+
+    """
+    self.system.solve()
+    facts = self.system.facts
+    parameters = self.system.parameters
+    return [(n,) + self._owner(n) for n in range(self.num_symbols)
+            if n not in facts and n not in parameters]
+
+  def _register(self, owner, start):
+    """
+    Record that the symbols of the :class:`~boxes.box.Box` or
+    :class:`~boxes.boxarray.BoxArray` *owner* start at *start*.
+    """
+    self._owner_starts.append(start)
+    self._owners.append(owner)
+
+  def _locate(self, symbol):
+    """
+    Return ``(i, index, edge)`` if *symbol* is the *edge* of the *i*'th
+    registered owner (and of box *index* if that owner is a box array, else
+    *index* is ``None``), or ``None`` if no box owns *symbol*.
+    """
+    i = bisect.bisect_right(self._owner_starts, symbol) - 1
+    if i < 0:
+      return None
+    owner = self._owners[i]
+    offset = symbol - self._owner_starts[i]
+    index = None
+    if isinstance(owner, boxes.boxarray.BoxArray):
+      index, offset = divmod(offset, 4)
+      if index >= len(owner):
+        return None
+    if offset >= 4:
+      return None
+    return i, index, _edges[offset]
+
+  def _owner(self, symbol):
+    """Return ``(box, edge)`` for *symbol*, or ``(None, None)``."""
+    location = self._locate(symbol)
+    if location is None:
+      return None, None
+    i, index, edge = location
+    owner = self._owners[i]
+    return (owner if index is None else owner[index]), edge
+
+  def _underdetermined(self):
+    """Return an :exc:`UnderdeterminedError` listing the free symbols."""
+    free = self.free_symbols()
+    names = []
+    for symbol, _, _ in free[:8]:
+      location = self._locate(symbol)
+      if location is None:
+        names.append(str(symmath.sym(symbol)))
+      elif location[1] is None:
+        names.append('{2} of box {0}'.format(*location))
+      else:
+        names.append('{2} of box array {0}[{1}]'.format(*location))
+    if len(free) > 8:
+      names.append('...')
+    return UnderdeterminedError(free, names)
+
+  def checkpoint(self):
+    """
+
+      Start recording changes to the context so they can be undone by
+      :func:`rollback`. See :func:`symmath.system.System.checkpoint`.
+
+      Boxes created after the checkpoint must not be used after rolling back.
+
+      >>> from boxes import Context
+      >>> ctx = Context()
+      >>> box = ctx.box(width=2)
+      >>> ctx.checkpoint()
+      >>> ctx.equate(box.height, 1)
+      >>> box.solve()
+      >>> print(box.size)
+      (2.0, 1.0)
+      >>> ctx.rollback()
+      >>> ctx.is_solved
+      False
+
+    """
+    self.system.checkpoint()
+    self._checkpoints.append((self.num_symbols, self.is_solved, self.values))
+
+  def rollback(self):
+    """
+      Undo all changes made since the latest :func:`checkpoint`.
+    """
+    self.system.rollback()
+    self.num_symbols, self.is_solved, self.values = self._checkpoints.pop()
+    while self.parameters and self.parameters[-1] >= self.num_symbols:
+      self.system.parameters.discard(self.parameters.pop())
+    while self._owner_starts and self._owner_starts[-1] >= self.num_symbols:
+      self._owner_starts.pop()
+      self._owners.pop()
+
+  def commit(self):
+    """
+      Keep the changes made since the latest :func:`checkpoint`.
+    """
+    self.system.commit()
+    self._checkpoints.pop()
+
+  @contextlib.contextmanager
+  def transaction(self):
+    """
+
+      Context manager which makes a :func:`checkpoint`, and commits the changes
+      if the block succeeds, or rolls them back if it raises an exception.
+
+    """
+    self.checkpoint()
+    try:
+      yield self
+    except BaseException:
+      self.rollback()
+      raise
+    self.commit()
+
   def sym(self):
     """
 
@@ -57,8 +393,96 @@ class Context:
     self.num_symbols += 1
     return symmath.sym(n)
 
+  def param(self):
+    """
+
+      Like :func:`sym`, but the new symbol is a parameter of the layout, which
+      is never eliminated. See :func:`compile`.
+
+    """
+    x = self.sym()
+    self.parameters.append(self.num_symbols - 1)
+    self.system.parameters.add(self.num_symbols - 1)
+    return x
+
   def box(self, *args, **kwargs):
     """
       Construct a :class:`~boxes.box.Box` using this context.
     """
     return boxes.box.Box(self, *args, **kwargs)
+
+  def boxes(self, n, **kwargs):
+    """
+      Construct a :class:`~boxes.boxarray.BoxArray` of *n* boxes using this
+      context. The keyword arguments are the same as for :func:`box`, but can
+      also be sequences with a value per box.
+    """
+    start = self.num_symbols
+    self.num_symbols += 4 * n
+    return boxes.boxarray.BoxArray(self, start, n, **kwargs)
+
+
+def solve_many(contexts, workers=None):
+  """
+
+    Solve many independent contexts, like calling :func:`Context.solve` on
+    each of them, but using a pool of worker processes (see
+    :func:`symmath.batch.solve_systems`). Only the deferred contexts (see
+    :class:`Context`) are solved by the workers, since the other contexts
+    already did the work when the constraints were added.
+
+    >>> from boxes import *
+    >>> contexts = [Context(deferred=True) for width in range(3)]
+    >>> figures = [ctx.box(width=w + 1, height=1, loc=(0, 0))
+    ...            for w, ctx in enumerate(contexts)]
+    >>> solve_many(contexts, workers=2)
+    >>> [fig.width for fig in figures]
+    [1.0, 2.0, 3.0]
+
+  """
+  contexts = list(contexts)
+  symmath.solve_systems([ctx.system for ctx in contexts], workers)
+  for ctx in contexts:
+    ctx.solve()
+
+
+class UnderdeterminedError(symmath.SymmathError):
+  """
+
+    Raised by :func:`Context.solve` and :func:`Context.compile` when some
+    symbols of the layout are not determined by the constraints. The message
+    names the first few of them, numbering the boxes and box arrays in the
+    order they were created.
+
+    .. attribute:: free
+
+      The free symbols, as returned by :func:`Context.free_symbols`.
+
+  """
+
+  def __init__(self, free, names):
+    super().__init__(
+        'Layout is not fully determined, {} free symbols: {}'
+        .format(len(free), ', '.join(names)))
+    self.free = free
+
+
+_edges = ('top', 'right', 'bottom', 'left')
+
+
+def _constraint_name():
+  """
+  Name the code which added a constraint: The outermost function of
+  :mod:`boxes.constrain` on the stack, or else the nearest function outside
+  this module.
+  """
+  frame = sys._getframe(2)
+  name = None
+  while frame is not None:
+    module = frame.f_globals.get('__name__')
+    if module == 'boxes.constrain':
+      name = 'constrain.' + frame.f_code.co_name
+    elif name is None and module != __name__:
+      name = '{}.{}'.format(module, frame.f_code.co_name)
+    frame = frame.f_back
+  return name
@@ -1,7 +1,11 @@
 """
 boxes.display
 -------------
+
+.. autofunction:: display
+.. autofunction:: raster
 """
+import contextlib
 
 
 def _trace(ctx, box):
@@ -10,6 +14,13 @@ def _trace(ctx, box):
   ctx.rectangle(x, y, w, h)
 
 
+def _phase(figure, name):
+  tracer = figure.context.tracer
+  if tracer is None:
+    return contextlib.nullcontext()
+  return tracer.span('display.' + name, cat='boxes')
+
+
 def display(filename, figure, boxes, dots_per_unit=30):
   """
 
@@ -21,14 +32,137 @@ def display(filename, figure, boxes, dots_per_unit=30):
   :arg figure: Defines the size of the figure.
   :type figure: :class:`~boxes.box.Box`
   :arg boxes: The boxes to draw.
-  :type boxes: An iterable of :class:`~boxes.box.Box` instances
+  :type boxes: An iterable of :class:`~boxes.box.Box` or
+    :class:`~boxes.boxarray.BoxArray` instances
   :arg float dots_per_unit: Scaling factor.
 
-  """
-  import cairo
+  Images are drawn with :mod:`cairo`. If it is not installed, SVG images are
+  written by :func:`boxes.svg.write` instead.
 
+  If the context of *figure* has a :attr:`~boxes.context.Context.tracer`, the
+  solving, drawing and writing phases are recorded.
+
+  """
   is_svg = filename.lower().endswith(".svg")
-  figure.solve()
+  with _phase(figure, 'solve'):
+    figure.solve()
+  if is_svg and not _have_cairo():
+    from boxes import svg
+    with _phase(figure, 'write'):
+      svg.write(filename, figure, boxes, dots_per_unit)
+    return
+  with _phase(figure, 'draw'):
+    surf = _draw(filename, figure, boxes, dots_per_unit, is_svg)
+  with _phase(figure, 'write'):
+    if is_svg:
+      surf.finish()
+    else:
+      surf.write_to_png(filename)
+
+
+def raster(figure, boxes, dots_per_unit=30):
+  """
+
+  Like :func:`display`, but render the image in memory and return the pixels
+  as a :class:`numpy.ndarray` of shape ``(height, width, 4)`` and type
+  ``uint8``. The channels are laid out as in cairo's ``FORMAT_ARGB32``, i.e.
+  B, G, R, A on little-endian machines.
+
+  With :mod:`cairo`, the array is a view of the data of the
+  ``cairo.ImageSurface`` the figure was drawn on, so no pixels are copied or
+  encoded. Without cairo, the boxes are filled and outlined by NumPy (without
+  anti-aliasing), and annotations are not drawn.
+
+  >>> from boxes import *
+  >>> from boxes.display import raster
+  >>> ctx = Context()
+  >>> fig = ctx.box(size=(2, 1))
+  >>> image = raster(fig, [fig.pad(0.25, 0.5)], dots_per_unit=10)
+  >>> image.shape
+  (11, 21, 4)
+
+  """
+  with _phase(figure, 'solve'):
+    figure.solve()
+  with _phase(figure, 'draw'):
+    if not _have_cairo():
+      return _rasterize(figure, boxes, dots_per_unit)
+    surf = _draw(None, figure, boxes, dots_per_unit, False)
+    surf.flush()
+    return _surface_array(surf)
+
+
+def _surface_array(surf):
+  """Return a view of the pixels of an ARGB32 ``cairo.ImageSurface``."""
+  import numpy
+  width, height = surf.get_width(), surf.get_height()
+  data = numpy.frombuffer(surf.get_data(), dtype=numpy.uint8)
+  rows = data.reshape(height, surf.get_stride() // 4, 4)
+  return rows[:, :width]
+
+
+def _rasterize(figure, boxes, dots_per_unit):
+  """Draw the image of :func:`raster` using NumPy only."""
+  import numpy
+  from boxes.svg import _rects
+  width, height = (int(x * dots_per_unit) + 1 for x in figure.size)
+  image = numpy.zeros((height, width, 4), dtype=numpy.uint8)
+  figure_edges = numpy.array([[figure.top, figure.right, figure.bottom,
+                               figure.left]], dtype=float)
+  edges = numpy.array([e for e, _ in _rects(figure.context, boxes)],
+                      dtype=float).reshape(-1, 4)
+  _fill(image, figure_edges, dots_per_unit, (255, 204, 179, 255))
+  _stroke(image, figure_edges, dots_per_unit, (170, 136, 119, 255))
+  _fill(image, edges, dots_per_unit, (185, 128, 41, 255))
+  _stroke(image, edges, dots_per_unit, (0, 0, 0, 255))
+  return image
+
+
+def _pixels(edges, dots_per_unit, shift):
+  """
+  Convert edges (top, right, bottom, left) to pixel indices. A pixel is
+  covered if its centre is within half a pixel after *shift* of the edge.
+  """
+  import numpy
+  # The image is drawn translated by half a pixel, as in _draw().
+  return numpy.ceil(edges * dots_per_unit + shift).astype(int)
+
+
+def _fill(image, edges, dots_per_unit, color):
+  height, width = image.shape[:2]
+  top, right, bottom, left = _pixels(edges, dots_per_unit, 0).T
+  for t, r, b, l in zip(top.clip(0, height), right.clip(0, width),
+                        bottom.clip(0, height), left.clip(0, width)):
+    image[t:b, l:r] = color
+
+
+def _stroke(image, edges, dots_per_unit, color):
+  # A line of width 1 at x covers the pixel whose centre is in [x - 0.5, x +
+  # 0.5), which is pixel ceil(x - 1).
+  height, width = image.shape[:2]
+  top, right, bottom, left = _pixels(edges, dots_per_unit, -0.5).T
+  for t, r, b, l in zip(top, right, bottom, left):
+    t0, b1 = max(t, 0), min(b + 1, height)
+    l0, r1 = max(l, 0), min(r + 1, width)
+    for x in (l, r):
+      if 0 <= x < width:
+        image[t0:b1, x] = color
+    for y in (t, b):
+      if 0 <= y < height:
+        image[y, l0:r1] = color
+
+
+def _have_cairo():
+  try:
+    import cairo
+  except ImportError:
+    return False
+  return True
+
+
+def _draw(filename, figure, boxes, dots_per_unit, is_svg):
+  import cairo
+  from boxes.svg import _rects
 
   width, height = (int(x * dots_per_unit) + 1 for x in figure.size)
   if is_svg:
@@ -46,8 +180,8 @@ def display(filename, figure, boxes, dots_per_unit=30):
   ctx.set_source_rgb(0.7/1.5, 0.8/1.5, 1.0/1.5)
   ctx.stroke()
 
-  for box in boxes:
-    _trace(ctx, box)
+  for (top, right, bottom, left), _ in _rects(figure.context, boxes):
+    ctx.rectangle(left, top, right - left, bottom - top)
   ctx.set_source_rgb(41 / 255, 128 / 255, 185 / 255)
   ctx.fill_preserve()
   ctx.set_source_rgb(0, 0, 0)
@@ -58,11 +192,10 @@ def display(filename, figure, boxes, dots_per_unit=30):
   ctx.set_font_size(11 / dots_per_unit)
   ctx.set_source_rgb(0, 0, 0)
 
-  for box in boxes:
-    if hasattr(box, 'annotation'):
+  for (_, _, bottom, left), annotation in _rects(figure.context, boxes):
+    if annotation is not None:
       _, td, _, _, _ = ctx.font_extents()
-      ctx.move_to(box.left + 4 / dots_per_unit, box.bottom - td - 3 / dots_per_unit)
-      ctx.show_text(box.annotation)
+      ctx.move_to(left + 4 / dots_per_unit, bottom - td - 3 / dots_per_unit)
+      ctx.show_text(annotation)
 
-  if not is_svg:
-    surf.write_to_png(filename)
+  return surf
@@ -0,0 +1,211 @@
+"""
+boxes.index
+-----------
+
+.. autoclass:: SpatialIndex
+  :members:
+
+"""
+
+import symmath
+from boxes.boxarray import BoxArray
+
+
+class SpatialIndex:
+  """
+
+    Answers geometric queries about the solved location of many boxes, such as
+    which boxes contain a point (hit-testing) or intersect a rectangle
+    (culling). Requires :mod:`numpy`.
+
+    The index is a packed R-tree: The boxes are sorted in
+    sort-tile-recursive order, and every node of the tree is the bounding box
+    of :attr:`fanout` consecutive nodes of the level below, so the whole tree is
+    a few flat arrays built in one pass. A query walks down the tree one level
+    at a time, testing all candidate nodes of a level at once.
+
+    :arg boxes.context.Context context:
+      The context of the boxes.
+    :arg boxes:
+      An iterable of :class:`~boxes.box.Box` or
+      :class:`~boxes.boxarray.BoxArray` objects to index. The boxes of an
+      array are indexed without creating a :class:`~boxes.box.Box` for each
+      of them.
+
+    The index is built from :attr:`~boxes.context.Context.values`. If the
+    context is solved again (or rolled back), it is rebuilt by the next query.
+
+    >>> from boxes import *
+    >>> from boxes.cartesian import Rect
+    >>> from boxes.index import SpatialIndex
+    >>> ctx = Context()
+    >>> cells = ctx.boxes(4, size=(1, 1), top=0)
+    >>> cells.hcat(spacing=1)
+    >>> ctx.equate(cells[0].left, 0)
+    >>> ctx.solve()
+    >>> index = SpatialIndex(ctx, [cells])
+    >>> index.containing((2.5, 0.5)) == [cells[1]]
+    True
+    >>> len(index.intersecting(Rect(0, 5, 1, 0.5)))
+    3
+    >>> index.nearest((7.5, 3)) is cells[3]
+    True
+
+    .. attribute:: fanout
+
+      The number of children of every node.
+
+  """
+
+  fanout = 16
+
+  def __init__(self, context, boxes):
+    self.context = context
+    self._items = list(boxes)
+    self._values = None
+    self._build()
+
+  def __len__(self):
+    return len(self._owners)
+
+  def _build(self):
+    import numpy
+    context = self.context
+    if not context.is_solved:
+      raise symmath.SymmathError('The context must be solved first')
+    values = numpy.frombuffer(context.values, dtype=float)
+    edges = []
+    owners = []
+    for i, item in enumerate(self._items):
+      if isinstance(item, BoxArray):
+        n = item.start
+        edges.append(values[n:n + 4 * len(item)].reshape(-1, 4))
+        owners.append(numpy.stack([
+            numpy.full(len(item), i), numpy.arange(len(item))], axis=1))
+      else:
+        rect = context.eval(item._rect)
+        edges.append(numpy.array(
+            [[rect.top, rect.right, rect.bottom, rect.left]], dtype=float))
+        owners.append(numpy.array([[i, -1]]))
+    edges = numpy.concatenate(edges) if edges else numpy.zeros((0, 4))
+    owners = (numpy.concatenate(owners) if owners
+              else numpy.zeros((0, 2), dtype=int))
+
+    order = _str_order(edges, self.fanout)
+    self._owners = owners[order]
+    # self._levels[0] holds the boxes, and self._levels[-1] the root.
+    self._levels = [numpy.ascontiguousarray(edges[order])]
+    while len(self._levels[-1]) > 1:
+      below = self._levels[-1]
+      starts = numpy.arange(0, len(below), self.fanout)
+      self._levels.append(numpy.stack([
+          numpy.minimum.reduceat(below[:, 0], starts),
+          numpy.maximum.reduceat(below[:, 1], starts),
+          numpy.maximum.reduceat(below[:, 2], starts),
+          numpy.minimum.reduceat(below[:, 3], starts),
+      ], axis=1))
+    self._values = context.values
+
+  def _check(self):
+    if self.context.values is not self._values:
+      self._build()
+
+  def _search(self, keep):
+    """
+    Return the positions of the boxes selected by *keep*, a function taking
+    an array of edges and returning a boolean mask. A node is kept if it may
+    contain a box that is kept.
+    """
+    import numpy
+    self._check()
+    levels = self._levels
+    nodes = numpy.arange(len(levels[-1]))
+    nodes = nodes[keep(levels[-1][nodes])]
+    for level in reversed(levels[:-1]):
+      nodes = (nodes[:, None] * self.fanout + numpy.arange(self.fanout)).ravel()
+      nodes = nodes[nodes < len(level)]
+      nodes = nodes[keep(level[nodes])]
+    return nodes
+
+  def _boxes(self, positions):
+    rval = []
+    for i, j in self._owners[positions]:
+      item = self._items[i]
+      rval.append(item if j < 0 else item[j])
+    return rval
+
+  def containing(self, point):
+    """
+
+      Return a list of the boxes containing *point* (including their edges),
+      in no particular order.
+
+    """
+    x, y = point
+
+    def keep(e):
+      return (e[:, 0] <= y) & (y <= e[:, 2]) & (e[:, 3] <= x) & (x <= e[:, 1])
+    return self._boxes(self._search(keep))
+
+  def intersecting(self, rect):
+    """
+
+      Return a list of the boxes intersecting the
+      :class:`~boxes.cartesian.Rect` *rect* (touching counts), in no particular
+      order.
+
+    """
+    def keep(e):
+      return ((e[:, 0] <= rect.bottom) & (rect.top <= e[:, 2]) &
+              (e[:, 3] <= rect.right) & (rect.left <= e[:, 1]))
+    return self._boxes(self._search(keep))
+
+  def nearest(self, point):
+    """
+
+      Return the box closest to *point*, or ``None`` if the index is empty.
+      The distance to a box containing *point* is zero.
+
+    """
+    import numpy
+    self._check()
+    x, y = point
+    levels = self._levels
+    if not len(levels[0]):
+      return None
+
+    def distances(e):
+      dx = numpy.maximum(numpy.maximum(e[:, 3] - x, x - e[:, 1]), 0)
+      dy = numpy.maximum(numpy.maximum(e[:, 0] - y, y - e[:, 2]), 0)
+      # Every box inside a node is at most as far away as the farthest corner
+      # of the node.
+      fx = numpy.maximum(numpy.abs(e[:, 3] - x), numpy.abs(e[:, 1] - x))
+      fy = numpy.maximum(numpy.abs(e[:, 0] - y), numpy.abs(e[:, 2] - y))
+      return dx * dx + dy * dy, fx * fx + fy * fy
+
+    nodes = numpy.arange(len(levels[-1]))
+    for level in reversed(levels[:-1]):
+      nodes = (nodes[:, None] * self.fanout + numpy.arange(self.fanout)).ravel()
+      nodes = nodes[nodes < len(level)]
+      near, far = distances(level[nodes])
+      nodes = nodes[near <= far.min()]
+    near, _ = distances(levels[0][nodes])
+    return self._boxes(nodes[[numpy.argmin(near)]])[0]
+
+
+def _str_order(edges, fanout):
+  """
+  Return the permutation sorting boxes in sort-tile-recursive order: sorted
+  into vertical slices by the x coordinate of their centres, and within each
+  slice by the y coordinate.
+  """
+  import numpy
+  n = len(edges)
+  x = edges[:, 1] + edges[:, 3]
+  y = edges[:, 0] + edges[:, 2]
+  leaves = -(-n // fanout)
+  slices = max(1, int(numpy.ceil(numpy.sqrt(leaves))))
+  per_slice = slices * fanout
+  order = numpy.argsort(x, kind='stable')
+  slice_of = numpy.arange(n) // per_slice
+  return order[numpy.lexsort((y[order], slice_of))]
@@ -0,0 +1,282 @@
+"""
+boxes.store
+-----------
+
+Save solved (or compiled) layouts to a compact binary file, and load them
+again without parsing.
+
+A file consists of a short header followed by flat arrays. The header is a
+magic string, the length of a JSON description of the arrays and the
+description itself. Every array is stored in native byte order and aligned to
+64 bytes, so :func:`load` maps the file into memory (see :class:`numpy.memmap`)
+and returns views of it. Loading is therefore nearly instant regardless of the
+size of the layout, and processes loading the same file share a single copy of
+it in the page cache.
+
+The following arrays are stored:
+
+``values``
+  The solved value of every symbol of the context (see
+  :attr:`boxes.context.Context.values`), followed by the values of any box
+  edges which are not plain symbols.
+``boxes``
+  An ``int32`` array of shape ``(n, 4)`` mapping the top, right, bottom and
+  left edges of each saved box to an index into ``values``.
+``matrix``, ``offset``
+  The :class:`~symmath.affine.AffineMap` given as *compiled*, if any.
+``leaves``
+  The rows of :attr:`~symmath.affine.AffineMap.structure` of the compiled map
+  (if it has one), in the order they appear in it. The shape of the structure
+  (which may contain :class:`~boxes.cartesian.Rect` and
+  :class:`~boxes.cartesian.Vect` objects, lists and tuples) is described in
+  the JSON header, with repeated elements of a list stored once. The
+  structure is only rebuilt when :attr:`Layout.compiled` is first used.
+
+These functions require :mod:`numpy`.
+
+.. autofunction:: save
+.. autofunction:: load
+.. autoclass:: Layout
+  :members:
+
+"""
+
+import json
+import struct
+
+from boxes.boxarray import BoxArray
+from boxes.cartesian import Rect, Vect
+import symmath
+
+_magic = b'BOXES01\n'
+_align = 64
+
+
+def save(filename, context, boxes=(), compiled=None):
+  """
+
+    Save a layout to *filename*. If *context* is solved, the values of all its
+    symbols are saved, along with the location of *boxes* (an iterable of
+    :class:`~boxes.box.Box` objects or :class:`~boxes.boxarray.BoxArray`
+    objects). *compiled* is an optional :class:`~symmath.affine.AffineMap`,
+    for instance the result of :func:`~boxes.context.Context.compile`.
+
+    >>> import os, tempfile
+    >>> from boxes import *
+    >>> from boxes.store import save, load
+    >>> ctx = Context()
+    >>> fig = ctx.box(size=(4, 3))
+    >>> inner = fig.pad(0.5, 1)
+    >>> fig.solve()
+    >>> filename = os.path.join(tempfile.mkdtemp(), 'layout.boxes')
+    >>> save(filename, ctx, [fig, inner])
+    >>> layout = load(filename)
+    >>> layout.width
+    array([4., 2.])
+    >>> print(layout.rect(1).loc)
+    (1.0, 0.5)
+
+  """
+  import numpy
+  arrays = {}
+  if context.is_solved:
+    extra = []
+    mapping = []
+    for item in boxes:
+      if isinstance(item, BoxArray):
+        indices = numpy.arange(4 * len(item), dtype=numpy.int32) + item.start
+        mapping.append(indices.reshape(len(item), 4))
+        continue
+      row = []
+      rect = item._rect
+      for edge in (rect.top, rect.right, rect.bottom, rect.left):
+        symbol = _symbol(edge)
+        if symbol is None or symbol >= context.num_symbols:
+          symbol = context.num_symbols + len(extra)
+          extra.append(context.eval(edge))
+        row.append(symbol)
+      mapping.append(numpy.array([row], dtype=numpy.int32))
+    arrays['values'] = numpy.concatenate([
+        numpy.frombuffer(context.values, dtype=float),
+        numpy.array(extra, dtype=float),
+    ])
+    if mapping:
+      arrays['boxes'] = numpy.concatenate(mapping)
+    else:
+      arrays['boxes'] = numpy.zeros((0, 4), dtype=numpy.int32)
+  if compiled is not None:
+    arrays['matrix'] = numpy.asarray(compiled.matrix, dtype=float)
+    arrays['offset'] = numpy.asarray(compiled.offset, dtype=float)
+  structure = None
+  if compiled is not None and compiled.structure is not None:
+    leaves = []
+    structure = _describe(compiled.structure, leaves)
+    arrays['leaves'] = numpy.array(leaves, dtype=numpy.int32)
+
+  description = {}
+  position = 0
+  for name, array in arrays.items():
+    description[name] = {
+        'offset': position,
+        'dtype': array.dtype.str,
+        'shape': array.shape,
+    }
+    position += _padded(array.nbytes)
+  header = json.dumps(
+      {'arrays': description, 'structure': structure}).encode()
+  start = _padded(len(_magic) + 4 + len(header))
+  with open(filename, 'wb') as f:
+    f.write(_magic)
+    f.write(struct.pack('<I', len(header)))
+    f.write(header)
+    f.write(bytes(start - f.tell()))
+    for name, array in arrays.items():
+      data = numpy.ascontiguousarray(array).tobytes()
+      f.write(data)
+      f.write(bytes(_padded(len(data)) - len(data)))
+
+
+def load(filename):
+  """
+    Load a layout saved by :func:`save`. Returns a :class:`Layout`.
+  """
+  import numpy
+  data = numpy.memmap(filename, mode='r')
+  if bytes(data[:len(_magic)]) != _magic:
+    raise ValueError('{} is not a saved layout'.format(filename))
+  length, = struct.unpack('<I', bytes(data[len(_magic):len(_magic) + 4]))
+  header = bytes(data[len(_magic) + 4:len(_magic) + 4 + length])
+  start = _padded(len(_magic) + 4 + length)
+  header = json.loads(header.decode())
+  arrays = {}
+  for name, info in header['arrays'].items():
+    dtype = numpy.dtype(info['dtype'])
+    shape = tuple(info['shape'])
+    offset = start + info['offset']
+    nbytes = dtype.itemsize * int(numpy.prod(shape))
+    arrays[name] = data[offset:offset + nbytes].view(dtype).reshape(shape)
+  return Layout(structure=header['structure'], **arrays)
+
+
+class Layout:
+  """
+
+    A layout loaded by :func:`load`. The arrays are read-only views of the
+    file.
+
+    .. attribute:: values
+
+      The value of every symbol, or ``None`` if the layout was not solved.
+
+    .. attribute:: boxes
+
+      An array of shape ``(n, 4)`` with indices into :attr:`values` for the
+      top, right, bottom and left edges of every saved box.
+
+  """
+
+  def __init__(self, values=None, boxes=None, matrix=None, offset=None,
+               leaves=None, structure=None):
+    self.values = values
+    self.boxes = boxes
+    self._matrix = matrix
+    self._offset = offset
+    self._leaves = leaves
+    self._structure = structure
+    self._compiled = None
+
+  @property
+  def compiled(self):
+    """The saved :class:`~symmath.affine.AffineMap`, or ``None``."""
+    if self._compiled is None and self._matrix is not None:
+      structure = None
+      if self._structure is not None:
+        structure = _rebuild(self._structure, iter(self._leaves.tolist()))
+      self._compiled = symmath.AffineMap(
+          self._matrix, self._offset, structure)
+    return self._compiled
+
+  def __len__(self):
+    return 0 if self.boxes is None else len(self.boxes)
+
+  def rect(self, i):
+    """Return the :class:`~boxes.cartesian.Rect` of box *i*."""
+    return Rect(*(float(self.values[k]) for k in self.boxes[i]))
+
+  def _edge(k):
+    def get(self):
+      return self.values[self.boxes[:, k]]
+    return get
+
+  top = property(_edge(0), doc='The top edge of every box, as an array.')
+  right = property(_edge(1), doc='The right edge of every box, as an array.')
+  bottom = property(_edge(2), doc='The bottom edge of every box, as an array.')
+  left = property(_edge(3), doc='The left edge of every box, as an array.')
+  del _edge
+
+  @property
+  def width(self):
+    """The width of every box, as an array."""
+    return self.right - self.left
+
+  @property
+  def height(self):
+    """The height of every box, as an array."""
+    return self.bottom - self.top
+
+
+def _symbol(expr):
+  """Return the symbol if *expr* is a plain symbol, otherwise None."""
+  if isinstance(expr, symmath.Expr) and len(expr.terms) == 1:
+    (symbol, coef), = expr.terms.items()
+    if coef == 1 and isinstance(symbol, int):
+      return symbol
+  return None
+
+
+def _describe(structure, leaves):
+  """
+  Return a JSON description of the shape of an
+  :attr:`~symmath.affine.AffineMap.structure`, appending its leaves to
+  *leaves*. A leaf is described by ``None``, a :class:`Rect` or :class:`Vect`
+  by a dictionary mapping the type to the descriptions of its fields, and a
+  list or tuple by a dictionary mapping the type to a list of runs ``[count,
+  description]`` of equally shaped elements.
+  """
+  if isinstance(structure, (Rect, Vect)):
+    fields = (
+        (structure.top, structure.right, structure.bottom, structure.left)
+        if isinstance(structure, Rect) else structure)
+    return {type(structure).__name__: [_describe(x, leaves) for x in fields]}
+  if isinstance(structure, (list, tuple)):
+    runs = []
+    for x in structure:
+      item = _describe(x, leaves)
+      if runs and runs[-1][1] == item:
+        runs[-1][0] += 1
+      else:
+        runs.append([1, item])
+    return {type(structure).__name__: runs}
+  if isinstance(structure, int):
+    leaves.append(structure)
+    return None
+  raise ValueError(
+      'Cannot save a compiled map returning {}'.format(type(structure)))
+
+
+def _rebuild(description, leaves):
+  """Inverse of :func:`_describe`, taking the leaves from an iterator."""
+  if description is None:
+    return next(leaves)
+  (kind, parts), = description.items()
+  if kind == 'Rect':
+    return Rect(*(_rebuild(x, leaves) for x in parts))
+  if kind == 'Vect':
+    return Vect(*(_rebuild(x, leaves) for x in parts))
+  items = [_rebuild(item, leaves) for count, item in parts
+           for _ in range(count)]
+  return items if kind == 'list' else tuple(items)
+
+
+def _padded(n):
+  return (n + _align - 1) // _align * _align
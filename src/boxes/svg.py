@@ -0,0 +1,123 @@
+"""
+boxes.svg
+---------
+
+A pure Python SVG writer used by :func:`boxes.display.display` when
+:mod:`cairo` is not installed. The image uses the same colours as the one drawn
+with cairo, but it is not identical: The top left corner of the figure is the
+origin of the image even if the figure is not at (0, 0), where cairo draws the
+figure at its location, and annotations are placed a fixed number of pixels
+from the bottom left corner of their box rather than by the metrics of the
+font.
+
+The elements are written to the file as they are generated, a chunk of boxes at
+a time, and the boxes are not :func:`solved <boxes.box.Box.rect>` one by one.
+The edges of a :class:`~boxes.boxarray.BoxArray` are read straight from
+:attr:`boxes.context.Context.values` without creating any
+:class:`~boxes.box.Box` objects, so even very large figures are written in
+constant memory.
+
+>>> import io
+>>> from boxes import *
+>>> from boxes.svg import write
+>>> ctx = Context()
+>>> bars = ctx.boxes(2, size=(1, 2), top=0)
+>>> bars.hcat(spacing=1)
+>>> fig = ctx.box(size=(3, 2))
+>>> ctx.equate(fig.left, bars[0].left)
+>>> fig.solve()
+>>> out = io.StringIO()
+>>> write(out, fig, [bars], dots_per_unit=10)
+>>> print(out.getvalue())  # doctest: +ELLIPSIS
+<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="31" height="21" ...>
+...
+<rect x="0.5" y="0.5" width="10" height="20"/>
+<rect x="20.5" y="0.5" width="10" height="20"/>
+...
+
+.. autofunction:: write
+
+"""
+from xml.sax.saxutils import escape
+
+from boxes.boxarray import BoxArray
+
+#: The number of boxes written to the file at a time.
+chunk_size = 4096
+
+_header = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" \
+viewBox="0 0 {width} {height}">
+<rect x="0.5" y="0.5" width="{w:g}" height="{h:g}" fill="rgb(179,204,255)" \
+stroke="rgb(119,136,170)" stroke-width="1"/>
+<g fill="rgb(41,128,185)" stroke="rgb(0,0,0)" stroke-width="1">
+'''
+
+_rect = '<rect x="{:g}" y="{:g}" width="{:g}" height="{:g}"/>\n'
+
+_text = (
+    '<text x="{:g}" y="{:g}" fill="rgb(0,0,0)" stroke="none" '
+    'font-family="Roboto Slab" font-size="11">{}</text>\n')
+
+
+def write(file, figure, boxes, dots_per_unit=30):
+  """
+
+  Write an SVG image of *boxes* inside *figure* to *file*, which is either a
+  filename or a file object opened in text mode. The context must already be
+  solved. The arguments are otherwise the same as for
+  :func:`boxes.display.display`.
+
+  """
+  if isinstance(file, str):
+    with open(file, 'w', encoding='utf-8') as f:
+      write(f, figure, boxes, dots_per_unit)
+    return
+  context = figure.context
+  top, right, bottom, left = _edges(context, figure)
+  file.write(_header.format(
+      width=int((right - left) * dots_per_unit) + 1,
+      height=int((bottom - top) * dots_per_unit) + 1,
+      w=(right - left) * dots_per_unit,
+      h=(bottom - top) * dots_per_unit,
+  ))
+  # The figure is the origin of the image. Like cairo's ctx.translate(0.5,
+  # 0.5), the half pixel keeps the lines of width 1 sharp.
+  x0 = 0.5 - left * dots_per_unit
+  y0 = 0.5 - top * dots_per_unit
+  chunk = []
+  for (top, right, bottom, left), annotation in _rects(context, boxes):
+    chunk.append(_rect.format(
+        x0 + left * dots_per_unit, y0 + top * dots_per_unit,
+        (right - left) * dots_per_unit, (bottom - top) * dots_per_unit))
+    if annotation is not None:
+      chunk.append(_text.format(
+          x0 + left * dots_per_unit + 4, y0 + bottom * dots_per_unit - 6,
+          escape(annotation)))
+    if len(chunk) >= chunk_size:
+      file.write(''.join(chunk))
+      chunk.clear()
+  file.write(''.join(chunk))
+  file.write('</g>\n</svg>\n')
+
+
+def _edges(context, box):
+  """Return the edges of *box* without caching them on the box."""
+  rect = context.eval(box._rect)
+  return rect.top, rect.right, rect.bottom, rect.left
+
+
+def _rects(context, boxes):
+  """
+  Yield the edges and the annotation (or ``None``) of every box in *boxes*.
+  """
+  values = context.values
+  for item in boxes:
+    if not isinstance(item, BoxArray):
+      yield _edges(context, item), getattr(item, 'annotation', None)
+      continue
+    n = item.start
+    for i, box in enumerate(item._boxes):
+      yield values[n + 4 * i:n + 4 * i + 4], getattr(box, 'annotation', None)
@@ -0,0 +1,195 @@
+"""
+boxes.text
+----------
+
+Measure the size of text, so boxes can be sized to fit their labels (see
+:func:`boxes.constrain.fit_text`). Sizes are given in the units of the layout,
+the same units as the :attr:`Font.size`.
+
+The text is measured with :mod:`cairo` if it is installed, and otherwise
+estimated by :func:`approximate`. Labels tend to repeat, so the measurements
+are kept in a bounded cache.
+
+>>> from boxes.text import Font, TextMetrics, approximate
+>>> metrics = TextMetrics(approximate)
+>>> font = Font('Roboto Slab', 10)
+>>> print(metrics.measure('Total', font))
+(23.5, 12.0)
+>>> for label in ['Total', 'Total', 'Mean']:
+...   size = metrics.measure(label, font)
+>>> metrics.hits, metrics.misses
+(2, 2)
+
+.. autoclass:: Font
+.. autoclass:: TextMetrics
+  :members:
+.. autofunction:: measure
+.. autofunction:: approximate
+.. autofunction:: cairo_metric
+
+"""
+from collections import OrderedDict, namedtuple
+
+from boxes.cartesian import Vect
+
+
+class Font(namedtuple('Font', 'face size')):
+  """
+
+    A font face (e.g. ``'Roboto Slab'``) and a size, which is the height of an
+    em in the units of the layout. This is a named tuple, so fonts can be used
+    as keys.
+
+  """
+
+  __slots__ = ()
+
+  def __new__(cls, face='Roboto Slab', size=1):
+    return super().__new__(cls, face, size)
+
+
+class TextMetrics:
+  """
+
+    Measures text with *metric*, a function taking a string and a
+    :class:`Font` and returning the width and height of the text, and caches
+    the results. Up to *maxsize* measurements are cached, and the least
+    recently used one is dropped when the cache is full. By default, the
+    metric is :func:`cairo_metric` if :mod:`cairo` is installed, and
+    :func:`approximate` otherwise.
+
+    .. attribute:: hits
+
+      The number of measurements found in the cache.
+
+    .. attribute:: misses
+
+      The number of measurements made by the metric.
+
+  """
+
+  def __init__(self, metric=None, maxsize=4096):
+    if metric is None:
+      metric = cairo_metric if _have_cairo() else approximate
+    self.metric = metric
+    self.maxsize = maxsize
+    self.hits = 0
+    self.misses = 0
+    self._cache = OrderedDict()
+
+  def measure(self, text, font=Font()):
+    """
+
+      Return the size of *text* in *font* as a
+      :class:`~boxes.cartesian.Vect`.
+
+    """
+    key = (font.face, font.size, text)
+    try:
+      size = self._cache[key]
+    except KeyError:
+      self.misses += 1
+      size = self._cache[key] = Vect(*self.metric(text, font))
+      if len(self._cache) > self.maxsize:
+        self._cache.popitem(last=False)
+      return size
+    self._cache.move_to_end(key)
+    self.hits += 1
+    return size
+
+  def clear(self):
+    """Drop all cached measurements and reset the counters."""
+    self._cache.clear()
+    self.hits = self.misses = 0
+
+
+#: The :class:`TextMetrics` used by :func:`measure`. Assign another instance to
+#: change the metric used by the whole library.
+metrics = None
+
+
+def measure(text, font=Font()):
+  """
+
+    Return the size of *text* in *font* using the shared :data:`metrics`,
+    which is created when it is first needed.
+
+  """
+  global metrics
+  if metrics is None:
+    metrics = TextMetrics()
+  return metrics.measure(text, font)
+
+
+# Widths of characters relative to the font size, for approximate().
+_narrow = set('fijlrtI.,:;!|\'` ')
+_wide = set('mwMW@')
+
+
+def approximate(text, font):
+  """
+
+    Estimate the size of *text* from the number of characters, assuming
+    typical proportions of a sans-serif font. The height is the line height,
+    1.2 times the font size.
+
+  """
+  width = 0
+  for c in text:
+    if c in _narrow:
+      width += 0.3
+    elif c in _wide:
+      width += 0.9
+    elif c.isupper() or c.isdigit():
+      width += 0.65
+    else:
+      width += 0.55
+  return width * font.size, 1.2 * font.size
+
+
+def cairo_metric(text, font):
+  """
+
+    Measure *text* with :mod:`cairo`, using the advance of the text as the
+    width and the ascent plus descent of the font as the height.
+
+  """
+  # Font sizes in layout units are small (often 1), where cairo would work
+  # with too few pixels to be accurate, so the text is measured at a fixed
+  # size and scaled.
+  ctx = _cairo_context(font.face)
+  scale = font.size / _reference_size
+  width = ctx.text_extents(text).x_advance
+  ascent, descent = ctx.font_extents()[:2]
+  return width * scale, (ascent + descent) * scale
+
+
+# The font size used by cairo_metric().
+_reference_size = 100
+
+_cairo_contexts = {}
+
+
+def _cairo_context(face):
+  try:
+    return _cairo_contexts[face]
+  except KeyError:
+    pass
+  import cairo
+  ctx = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+  ctx.select_font_face(face, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+  # Hinted metrics are rounded to whole pixels, which would not scale.
+  options = cairo.FontOptions()
+  options.set_hint_metrics(cairo.HINT_METRICS_OFF)
+  ctx.set_font_options(options)
+  ctx.set_font_size(_reference_size)
+  _cairo_contexts[face] = ctx
+  return ctx
+
+
+def _have_cairo():
+  try:
+    import cairo
+  except ImportError:
+    return False
+  return True
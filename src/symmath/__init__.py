@@ -3,8 +3,13 @@ symmath
 -------
 
 Convenience reexports. Typing ``from symmath import *`` imports everything from
-:mod:`symmath.expr` and :mod:`symmath.system`.
+:mod:`symmath.expr`, :mod:`symmath.system`, :mod:`symmath.sparse`,
+:mod:`symmath.affine`, :mod:`symmath.trace` and :mod:`symmath.batch`.
 
 """
 from symmath.expr import *
 from symmath.system import *
+from symmath.sparse import *
+from symmath.affine import *
+from symmath.trace import *
+from symmath.batch import *
@@ -0,0 +1,121 @@
+"""
+symmath.affine
+--------------
+
+.. doctest::
+  :hide:
+
+  >>> from symmath import *
+
+.. autoclass:: AffineMap
+  :members:
+
+"""
+from symmath.expr import SymmathError
+
+__all__ = ['AffineMap']
+
+
+class AffineMap:
+  """
+
+  A compiled affine function from a vector of parameters to a set of outputs,
+  ``outputs = matrix @ params + offset``. Calling the map evaluates it for a
+  single parameter vector or a whole batch of them (one vector per row) using
+  a single matrix multiplication.
+
+  Instances are normally created by :func:`from_system`. Requires
+  :mod:`numpy`.
+
+  >>> w = sym('w')
+  >>> x = sym('x')
+  >>> system = System()
+  >>> system.parameters.add('w')
+  >>> system.equate(2 * x, w + 1)
+  >>> f = AffineMap.from_system(system, ['w'], [x, x + w])
+  >>> f([3])
+  [2.0, 5.0]
+  >>> f([[3], [5]])
+  [array([2., 3.]), array([5., 8.])]
+
+  .. attribute:: matrix
+
+    A :class:`numpy.ndarray` of shape ``(outputs, parameters)``.
+
+  .. attribute:: offset
+
+    A :class:`numpy.ndarray` of shape ``(outputs,)``.
+
+  .. attribute:: structure
+
+    The shape of the result, as passed to :func:`from_system` but with each
+    expression replaced by its row in :attr:`matrix`, or ``None`` if calling
+    the map should return the raw output array.
+
+  """
+
+  def __init__(self, matrix, offset, structure=None):
+    self.matrix = matrix
+    self.offset = offset
+    self.structure = structure
+
+  @classmethod
+  def from_system(cls, system, parameters, val):
+    """
+
+    Express *val* as an affine function of the given *parameters* (a sequence
+    of symbols) using the facts of *system*. The symbols of *val* must be
+    fully determined by the parameters.
+
+    *val* can be an expression, a structure supporting ``_symmath_eval`` (see
+    :func:`~symmath.system.System.eval`), or a list or tuple of those.
+    Calling the resulting map returns the same structure with the expressions
+    replaced by numbers (or by arrays, for a batch of parameter vectors).
+
+    """
+    import numpy
+    columns = {p: i for i, p in enumerate(parameters)}
+    rows = []
+
+    def leaf(expr):
+      expr = system.simplify(expr)
+      row = numpy.zeros(len(columns))
+      for symbol, coef in expr.terms.items():
+        if symbol is None:
+          continue
+        try:
+          row[columns[symbol]] = coef
+        except KeyError:
+          raise SymmathError(
+              'Symbol {} is not determined by the parameters'.format(symbol))
+      rows.append((row, expr[None]))
+      return len(rows) - 1
+
+    structure = _map(leaf, val)
+    matrix = numpy.array([r for r, _ in rows]).reshape(len(rows), len(columns))
+    offset = numpy.array([c for _, c in rows], dtype=float)
+    return cls(matrix, offset, structure)
+
+  def __call__(self, params):
+    """
+
+    Evaluate the map for a parameter vector, or a 2D array holding one
+    parameter vector per row.
+
+    """
+    import numpy
+    params = numpy.asarray(params, dtype=float)
+    outputs = params @ self.matrix.T + self.offset
+    if self.structure is None:
+      return outputs
+    if outputs.ndim == 1:
+      return _map(lambda i: float(outputs[i]), self.structure)
+    return _map(lambda i: outputs[:, i], self.structure)
+
+
+def _map(f, val):
+  if hasattr(val, '_symmath_eval'):
+    return val._symmath_eval(f)
+  if isinstance(val, (list, tuple)):
+    return type(val)(_map(f, x) for x in val)
+  return f(val)
@@ -0,0 +1,164 @@
+"""
+symmath.batch
+-------------
+
+.. doctest::
+  :hide:
+
+  >>> from symmath import *
+
+.. autofunction:: solve_systems
+
+"""
+from array import array
+import threading
+
+from symmath.expr import Expr
+from symmath.sparse import FactorCache
+
+__all__ = ['solve_systems']
+
+
+def solve_systems(systems, workers=None):
+  """
+
+  Solve the recorded :attr:`~symmath.system.System.equations` of many
+  independent deferred systems in a pool of worker processes. The result is
+  the same as calling :func:`~symmath.system.System.solve` on every system.
+
+  The equations of a system are sent to a worker as a few flat arrays (the
+  symbols, and the coefficients of every equation in compressed sparse row
+  form), and the facts come back in the same form, so little time is spent
+  pickling. Systems without recorded equations are skipped.
+
+  Factorizations cannot be sent between processes, so the
+  :class:`~symmath.sparse.FactorCache` of a system is not used by the
+  workers. Instead each worker keeps a cache of the same size, which is
+  reused by the systems it solves, and the hits and misses are added to the
+  counters of the system's cache.
+
+  :arg systems: An iterable of :class:`~symmath.system.System` objects.
+  :arg workers: The number of worker processes (by default one per CPU), or a
+    :class:`concurrent.futures.Executor` to submit the systems to.
+
+  >>> x, y = sym('x'), sym('y')
+  >>> systems = []
+  >>> for total in range(3):
+  ...   system = System(deferred=True)
+  ...   system.equate(x + y, total)
+  ...   system.equate(x - y, 1)
+  ...   systems.append(system)
+  >>> solve_systems(systems, workers=2)
+  >>> [system.eval(x) for system in systems]
+  [0.5, 1.0, 1.5]
+
+  """
+  import concurrent.futures
+  import os
+  systems = [system for system in systems if system.equations]
+  recorded = []
+  jobs = []
+  for system in systems:
+    # Take the equations out first, as simplify() would solve them.
+    equations, system.equations = system.equations, []
+    recorded.append(equations)
+    if system.facts:
+      equations = [system.simplify(expr) for expr in equations]
+    cache = getattr(system, 'cache', None)
+    maxsize = None if cache is None else cache.maxsize
+    jobs.append((type(system), system.pivot, system.parameters, maxsize,
+                 _pack(equations)))
+  if not jobs:
+    return
+  try:
+    if isinstance(workers, concurrent.futures.Executor):
+      results = list(workers.map(_solve_packed, jobs))
+    else:
+      chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+      with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        results = list(executor.map(_solve_packed, jobs, chunksize=chunksize))
+  except BaseException:
+    for system, equations in zip(systems, recorded):
+      system.equations = equations
+    raise
+  for system, equations, job, (keys, facts, counts) in zip(
+      systems, recorded, jobs, results):
+    # Record the equations as solved, so a rollback restores them.
+    if system._journal is not None:
+      system._journal.append((None, equations))
+    if counts is not None:
+      system.cache.hits += counts[0]
+      system.cache.misses += counts[1]
+    symbols = job[-1][0]
+    for key, expr in zip(keys, _unpack((symbols,) + facts)):
+      system._add_fact(symbols[key], expr)
+
+
+def _pack(exprs):
+  """
+
+  Convert a list of expressions into the tuple ``(symbols, indptr, indices,
+  data)``: The terms of expression *i* are ``data[k] * symbols[indices[k]]``
+  for ``k`` in ``range(indptr[i], indptr[i + 1])``, where the constant term
+  has the symbol ``None``.
+
+  """
+  columns = {}
+  indptr = array('q', [0])
+  indices = array('q')
+  data = array('d')
+  for expr in exprs:
+    for symbol, coef in expr.terms.items():
+      indices.append(columns.setdefault(symbol, len(columns)))
+      data.append(coef)
+    indptr.append(len(indices))
+  return list(columns), indptr, indices, data
+
+
+def _unpack(packed):
+  """Inverse of :func:`_pack`."""
+  symbols, indptr, indices, data = packed
+  exprs = []
+  for i in range(len(indptr) - 1):
+    expr = Expr()
+    terms = expr.terms
+    for k in range(indptr[i], indptr[i + 1]):
+      terms[symbols[indices[k]]] = data[k]
+    exprs.append(expr)
+  return exprs
+
+
+# The factor caches of the current worker, by size. Every thread has its own,
+# as the caches are not thread-safe.
+_worker = threading.local()
+
+
+def _worker_cache(maxsize):
+  caches = _worker.__dict__.setdefault('caches', {})
+  try:
+    return caches[maxsize]
+  except KeyError:
+    cache = caches[maxsize] = FactorCache(maxsize)
+    return cache
+
+
+def _solve_packed(job):
+  cls, pivot, parameters, maxsize, packed = job
+  system = cls()
+  system.pivot = pivot
+  system.parameters = set(parameters)
+  counts = None
+  if maxsize is not None:
+    system.cache = _worker_cache(maxsize)
+    hits, misses = system.cache.hits, system.cache.misses
+  system._solve(_unpack(packed))
+  if maxsize is not None:
+    counts = system.cache.hits - hits, system.cache.misses - misses
+  symbols = packed[0]
+  position = {symbol: i for i, symbol in enumerate(symbols)}
+  keys = array('q', (position[key] for key in system.facts))
+  table, indptr, indices, data = _pack(system.facts.values())
+  # The facts only mention symbols of the equations, so they are sent back
+  # using the symbol table of the equations.
+  indices = array('q', (position[table[k]] for k in indices))
+  return keys, (indptr, indices, data), counts
@@ -37,15 +37,33 @@ class Expr(symmath.numerictype.NumericType):
   .. attribute:: tolerance
 
     Numbers smaller than the *tolerance* in absolute value are converted to 0.
+    The default is 1e-8. A copy of an expression has the same tolerance.
   """
 
-  def __init__(self, other=None, tolerance=1e-8):
+  # Expressions are small and there can be a lot of them, so there is no
+  # instance dictionary, and the default tolerance is a class attribute.
+  # Expressions with another tolerance are instances of _TolerantExpr, which
+  # stores it.
+  __slots__ = ('terms',)
+
+  tolerance = 1e-8
+
+  def __new__(cls, other=None, tolerance=None):
+    if isinstance(other, Expr):
+      tolerance = other.tolerance
+    if cls is Expr and tolerance is not None and tolerance != Expr.tolerance:
+      cls = _TolerantExpr
+    return object.__new__(cls)
+
+  def __init__(self, other=None, tolerance=None):
     if isinstance(other, Expr):
       self.terms = other.terms.copy()
-      self.tolerance = other.tolerance
+      if type(self) is _TolerantExpr:
+        self.tolerance = other.tolerance
     else:
       self.terms = {}
-      self.tolerance = tolerance
+      if type(self) is _TolerantExpr:
+        self.tolerance = tolerance
       if other is not None:
         self[None] = other
 
@@ -79,7 +97,50 @@ class Expr(symmath.numerictype.NumericType):
     3 y + 2 z + 1
     """
     coef = self.terms.pop(symbol, 0)
-    self += coef * arg
+    if coef:
+      self.add_scaled(arg, coef)
+
+  def add_scaled(self, other, coef):
+    """
+
+    Add *coef* times *other* to this expression in place. This is the same as
+    ``x += coef * other``, but without creating any temporary expressions.
+
+    >>> x = sym('x')
+    >>> y = sym('y')
+    >>> e = x + y
+    >>> e.add_scaled(2 * y - 1, -0.5)
+    >>> e
+    Expr(x + 0.5)
+    """
+    terms = self.terms
+    tolerance = self.tolerance
+    if other is self:
+      # The terms change while we iterate over them.
+      items = list(terms.items())
+    elif isinstance(other, Expr):
+      items = other.terms.items()
+    else:
+      items = ((None, other),)
+    for s, x in items:
+      value = terms.get(s, 0) + coef * x
+      if abs(value) <= tolerance:
+        terms.pop(s, None)
+      else:
+        terms[s] = value
+
+  def is_zero(self):
+    """
+    Return true if the expression is equal to 0. Same as ``x == 0``.
+    """
+    return not self.terms
+
+  def is_scalar(self):
+    """
+    Return true if the expression contains no symbols.
+    """
+    terms = self.terms
+    return not terms or (len(terms) == 1 and None in terms)
 
   def scalar(self):
     """
@@ -100,14 +161,16 @@ class Expr(symmath.numerictype.NumericType):
     3
 
     """
-    value = self[None]
-    if self != value:
+    if not self.is_scalar():
       raise SymmathError('Not a scalar')
-    return value
+    return self[None]
 
   def __iadd__(self, other):
-    for s, x in Expr(other).terms.items():
-      self[s] += x
+    self.add_scaled(other, 1)
+    return self
+
+  def __isub__(self, other):
+    self.add_scaled(other, -1)
     return self
 
   def __imul__(self, val):
@@ -118,8 +181,22 @@ class Expr(symmath.numerictype.NumericType):
     return self
 
   def __eq__(self, other):
-    diff = self - Expr(other)
-    return len(diff.terms) == 0
+    # Compare term by term instead of building the difference.
+    if isinstance(other, Expr):
+      other = other.terms
+    elif other is None:
+      other = {}
+    else:
+      other = {None: other}
+    terms = self.terms
+    tolerance = self.tolerance
+    for s, x in terms.items():
+      if abs(x - other.get(s, 0)) > tolerance:
+        return False
+    for s, x in other.items():
+      if s not in terms and abs(x) > tolerance:
+        return False
+    return True
 
   def __str__(self):
     return symmath.format.format(self)
@@ -128,6 +205,12 @@ class Expr(symmath.numerictype.NumericType):
     return "Expr(" + str(self) + ")"
 
 
+class _TolerantExpr(Expr):
+  """An :class:`Expr` with a tolerance other than the default."""
+
+  __slots__ = ('tolerance',)
+
+
 def sym(symbol):
   """
   Create an expression containing just the given symbol.
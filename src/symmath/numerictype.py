@@ -1,4 +1,5 @@
 class NumericType:
+  __slots__ = ()
 
   def __add__(self, x):
     y = self.__class__(self)
@@ -34,7 +35,9 @@ class NumericType:
     return self
 
   def __sub__(self, other):
-    return self + (-other)
+    y = self.__class__(self)
+    y -= other
+    return y
 
   def __rsub__(self, other):
     return (-self) + other
@@ -0,0 +1,241 @@
+"""
+symmath.sparse
+--------------
+
+.. doctest::
+  :hide:
+
+  >>> from symmath import *
+
+.. autoclass:: SparseSystem
+  :members:
+  :show-inheritance:
+
+.. autoclass:: FactorCache
+  :members:
+
+"""
+from symmath.expr import Expr, SymmathError
+from symmath.system import System
+import collections
+import hashlib
+
+__all__ = ['SparseSystem', 'FactorCache']
+
+
+class SparseSystem(System):
+  """
+
+  A drop-in replacement for :class:`~symmath.system.System` which records
+  every equation as a row of a sparse coefficient matrix instead of eliminating
+  a symbol right away. The rows are solved in one go (using a sparse LU
+  factorization from SciPy) by :func:`~symmath.system.System.solve`, which is
+  called automatically by :func:`~symmath.system.System.eval`.
+
+  This is much faster than :class:`~symmath.system.System` for large, fully
+  determined systems. Redundant equations are allowed, but an over-constrained
+  system is only detected when it is solved. If the recorded equations do not
+  determine every symbol (or the system has
+  :attr:`~symmath.system.System.parameters`), the engine falls back to the
+  deferred elimination of :class:`~symmath.system.System`, so the results are
+  the same. Nearly singular systems, whose equations are only independent
+  because of round-off, fall back as well.
+
+  Requires :mod:`numpy` and :mod:`scipy`.
+
+  :arg FactorCache cache:
+    An optional cache of factorizations, typically shared by many systems.
+
+  >>> x = sym('x')
+  >>> y = sym('y')
+  >>> system = SparseSystem()
+  >>> system.equate(x + y, 3)
+  >>> system.equate(x - y, 1)
+  >>> len(system.equations)
+  2
+  >>> system.eval(x)
+  2.0
+
+  """
+
+  def __init__(self, cache=None):
+    super().__init__(deferred=True)
+    self.cache = cache
+
+  def _solve(self, equations):
+    if self.facts:
+      equations = [self.simplify(expr) for expr in equations]
+    columns = {}
+    indptr = [0]
+    indices = []
+    data = []
+    rhs = []
+    for expr in equations:
+      for symbol, coef in expr.terms.items():
+        if symbol is None:
+          continue
+        indices.append(columns.setdefault(symbol, len(columns)))
+        data.append(coef)
+      indptr.append(len(indices))
+      rhs.append(-expr[None])
+    if not self.parameters and len(equations) >= len(columns):
+      values = self._lu_solve(columns, indptr, indices, data, rhs)
+      if values is not None:
+        for symbol, i in columns.items():
+          self._add_fact(symbol, Expr(float(values[i])))
+        return
+    super()._solve(equations)
+
+  def _lu_solve(self, columns, indptr, indices, data, rhs):
+    import numpy
+    indptr = numpy.array(indptr, dtype=numpy.intp)
+    indices = numpy.array(indices, dtype=numpy.intp)
+    data = numpy.array(data, dtype=float)
+    rhs = numpy.array(rhs, dtype=float)
+    if self.cache is None:
+      factors = _factorize(indptr, indices, data, len(rhs), len(columns))
+    else:
+      key = FactorCache.key(columns, indptr, indices, data)
+      factors = self.cache.get(key, _missing)
+      if factors is _missing:
+        factors = _factorize(indptr, indices, data, len(rhs), len(columns))
+        self.cache.put(key, factors)
+    if factors is None:
+      return None
+    matrix, lu = factors
+    if matrix.shape[0] > matrix.shape[1]:
+      values = lu.solve(matrix.T @ rhs)
+    else:
+      values = lu.solve(rhs)
+    residual = matrix @ values - rhs
+    # Round-off grows with the terms of the equations, not only with the
+    # constants, so a large solution allows a larger residual.
+    scale = (1 + numpy.abs(rhs).max(initial=0) +
+             abs(matrix).max() * numpy.abs(values).max(initial=0))
+    if numpy.abs(residual).max(initial=0) > scale * 1e-8:
+      raise SymmathError('System is over-constrained')
+    return values
+
+
+class FactorCache:
+  """
+
+  A bounded cache of sparse factorizations, which can be shared by many
+  :class:`SparseSystem` instances to skip the factorization when the same
+  structure is solved again.
+
+  The key of a solve is a hash of the structure of the equations: the symbols
+  and the coefficients of every equation, but not the constants. Layouts
+  which only differ in numbers (sizes, margins, ...) therefore share an entry,
+  and solving them only costs the back-substitution. The least recently used
+  entry is dropped when there are more than *maxsize* entries.
+
+  The elimination of :class:`~symmath.system.System` does not factorize, so
+  the cache has no effect there. The same reuse is available for such systems
+  by making the varying numbers :attr:`~symmath.system.System.parameters` and
+  compiling the layout once with :class:`~symmath.affine.AffineMap`, which is
+  then evaluated for every set of numbers.
+
+  >>> cache = FactorCache(maxsize=16)
+  >>> x = sym('x')
+  >>> y = sym('y')
+  >>> for width in [1, 2, 3]:
+  ...   system = SparseSystem(cache=cache)
+  ...   system.equate(x + y, width)
+  ...   system.equate(x - y, 1)
+  ...   print(system.eval(x))
+  1.0
+  1.5
+  2.0
+  >>> cache.hits, cache.misses
+  (2, 1)
+
+  .. attribute:: hits
+
+    The number of solves which reused a factorization.
+
+  .. attribute:: misses
+
+    The number of solves which had to factorize.
+
+  """
+
+  def __init__(self, maxsize=128):
+    self.maxsize = maxsize
+    self.hits = 0
+    self.misses = 0
+    self._entries = collections.OrderedDict()
+
+  def __len__(self):
+    return len(self._entries)
+
+  @staticmethod
+  def key(columns, indptr, indices, data):
+    """Return the structural hash of a sparse system."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(repr(list(columns)).encode())
+    for array in (indptr, indices, data):
+      h.update(array.tobytes())
+    return h.digest()
+
+  def get(self, key, default=None):
+    """Return the entry for *key*, and count a hit or a miss."""
+    try:
+      value = self._entries[key]
+    except KeyError:
+      self.misses += 1
+      return default
+    self._entries.move_to_end(key)
+    self.hits += 1
+    return value
+
+  def put(self, key, value):
+    """Add an entry, dropping the least recently used if necessary."""
+    self._entries[key] = value
+    self._entries.move_to_end(key)
+    while len(self._entries) > self.maxsize:
+      self._entries.popitem(last=False)
+
+  def clear(self):
+    """Drop all entries and reset the counters."""
+    self._entries.clear()
+    self.hits = self.misses = 0
+
+
+_missing = object()
+
+
+def _factorize(indptr, indices, data, rows, n):
+  """
+
+  Return the matrix of a system together with an LU factorization used to
+  solve it, or None if the system is singular or nearly so.
+
+  """
+  import numpy
+  import scipy.sparse
+  import scipy.sparse.linalg
+  matrix = scipy.sparse.csr_matrix((data, indices, indptr), shape=(rows, n))
+  if rows > n:
+    # Redundant equations are common (e.g. aligning boxes that already have
+    # the same height), so solve the normal equations and check afterwards
+    # that every equation holds.
+    lhs = (matrix.T @ matrix).tocsc()
+  else:
+    lhs = matrix.tocsc()
+  try:
+    lu = scipy.sparse.linalg.splu(lhs)
+  except RuntimeError:
+    # The matrix is singular.
+    return None
+  # splu() only fails on exact zero pivots. Round-off turns the pivots of a
+  # rank deficient matrix into tiny numbers instead, and solving with those
+  # gives huge, meaningless values.
+  pivots = numpy.abs(lu.U.diagonal())
+  if not pivots.size or pivots.min() <= _singular * pivots.max():
+    return None
+  return matrix, lu
+
+
+# Pivots this much smaller than the largest pivot are treated as zero.
+_singular = 1e-10
@@ -11,6 +11,15 @@ symmath.system
   :members:
   :undoc-members:
 
+  .. attribute:: stats
+
+    A :class:`Stats` instance counting the work done by this system.
+
+  .. attribute:: tracer
+
+    A :class:`~symmath.trace.Tracer` recording every call to :func:`equate`
+    and :func:`solve`, or ``None`` (the default) to disable tracing.
+
   .. attribute:: facts
 
     A dictionary mapping symbol names to equivalent expressions. Each value in
@@ -18,26 +27,172 @@ symmath.system
     keys. Consider this attribute read-only, and use :func:`equate` to add a
     fact instead of modifying this dictionary.
 
+  .. attribute:: occurrences
+
+    A dictionary mapping symbols to the set of keys in :attr:`facts` whose
+    expressions contain that symbol. :func:`equate` uses this index to only
+    substitute into the facts that mention the eliminated symbol. Like
+    :attr:`facts`, this attribute is read-only.
+
+  .. attribute:: parameters
+
+    A set of symbols which are never eliminated. Facts are expressed in terms
+    of these symbols, so the solution can be evaluated for many parameter
+    values (see :class:`~symmath.affine.AffineMap`). An equation involving
+    only parameters over-constrains the system.
+
+  .. attribute:: equations
+
+    Equations recorded by :func:`equate` in deferred mode which have not been
+    solved yet. Each :class:`~symmath.expr.Expr` in this list is equal to
+    zero.
+
+.. autoclass:: Stats
+  :members:
+
 """
 from symmath.expr import Expr, SymmathError
 from collections import abc
+import contextlib
+import time
 
+__all__ = ['System', 'Stats']
 
-class System:
+
+class Stats:
+  """
+
+  Counters describing the work done by a :class:`System`. Updating them costs
+  a few additions per call, so they are always enabled. Call :func:`reset` to
+  start counting from zero, e.g. between requests.
+
+  .. attribute:: equations
+
+    The number of equations passed to :func:`System.equate` (after unpacking
+    structures such as rectangles).
+
+  .. attribute:: redundant
+
+    The number of equations which turned out to be redundant and were skipped.
+
+  .. attribute:: eliminations
+
+    The number of symbols eliminated, i.e. facts added.
+
+  .. attribute:: substitutions
+
+    The number of times a fact was substituted into an expression, either when
+    rewriting an expression or when eliminating a symbol from the other facts.
+
+  .. attribute:: fill_in
+
+    The total number of terms introduced into existing facts by eliminations.
+
+  .. attribute:: max_fill_in
+
+    The largest fill-in created by a single elimination.
+
+  .. attribute:: equate_time, rewrite_time, eval_time, solve_time
+
+    Seconds spent in :func:`System.equate`, :func:`System.rewrite`,
+    :func:`System.eval` and :func:`System.solve`. Rewriting is part of the
+    other operations, so these times overlap.
+
+  """
+
+  fields = (
+      'equations', 'redundant', 'eliminations', 'substitutions', 'fill_in',
+      'max_fill_in', 'equate_time', 'rewrite_time', 'eval_time', 'solve_time',
+  )
 
   def __init__(self):
+    self.reset()
+
+  def reset(self):
+    """Set all counters to zero."""
+    for field in self.fields:
+      setattr(self, field, 0)
+
+  def as_dict(self):
+    """Return the counters as a dictionary."""
+    return {field: getattr(self, field) for field in self.fields}
+
+
+class System:
+  """
+
+  :arg bool deferred:
+    If true, :func:`equate` only records equations in :attr:`equations`, and
+    all of them are solved in one batch by :func:`solve`. This avoids most of
+    the intermediate fill-in produced by eliminating symbols in the order the
+    equations happen to arrive.
+  :arg workers:
+    The number of processes used by :func:`solve` to solve independent
+    :func:`components` concurrently, or a :class:`concurrent.futures.Executor`
+    to submit them to. By default everything is solved in this process. Only
+    components with at least :attr:`parallel_threshold` equations are worth
+    sending to another process.
+  :arg str pivot:
+    How to choose the symbol eliminated by an equation (the pivot).
+    ``'largest'`` (the default) picks the symbol with the largest coefficient.
+    ``'abs'`` picks the symbol with the largest coefficient in absolute value,
+    which minimizes round-off errors, but tends to create more terms in the
+    facts of deferred systems. ``'markowitz'`` picks
+    the symbol occurring in the fewest :attr:`facts` among those with a
+    coefficient of at least a tenth of the largest one, which keeps the facts
+    sparse at a slight cost in accuracy.
+
+  """
+
+  #: The smallest component :func:`solve` sends to a worker process.
+  parallel_threshold = 256
+
+  pivots = ('largest', 'abs', 'markowitz')
+
+  def __init__(self, deferred=False, workers=None, pivot='largest'):
+    if pivot not in self.pivots:
+      raise ValueError('Unknown pivot strategy: {}'.format(repr(pivot)))
     self.facts = {}
+    self.occurrences = {}
+    self.deferred = deferred
+    self.workers = workers
+    self.pivot = pivot
+    self.equations = []
+    self.parameters = set()
+    self._checkpoints = []
+    self._journal = None
+    self.stats = Stats()
+    self.tracer = None
+    self._trace_args = None
 
   def rewrite(self, expr):
     """
-    Substitue all known :attr:`facts` into *expr*.
+    Substitue all known :attr:`facts` into *expr*. Recorded
+    :attr:`equations` are solved first.
     """
+    if self.equations:
+      self.solve()
+    start = time.perf_counter()
+    facts = self.facts
+    substitutions = 0
     for symbol in list(expr.terms):
       try:
-        fact = self.facts[symbol]
+        fact = facts[symbol]
       except KeyError:
         continue
       expr.substitue(symbol, fact)
+      substitutions += 1
+    stats = self.stats
+    stats.substitutions += substitutions
+    stats.rewrite_time += time.perf_counter() - start
+
+  def fact_size(self):
+    """
+    Return the total number of terms in all :attr:`facts` and the number of
+    terms in the largest fact.
+    """
+    sizes = [len(fact.terms) for fact in self.facts.values()]
+    return sum(sizes), max(sizes, default=0)
 
   def simplify(self, expr):
     """
@@ -63,8 +218,15 @@ class System:
     and should return a fully evaluated copy of itself.
 
     """
+    start = time.perf_counter()
+    try:
+      return self._eval(val)
+    finally:
+      self.stats.eval_time += time.perf_counter() - start
+
+  def _eval(self, val):
     if hasattr(val, '_symmath_eval'):
-      return val._symmath_eval(self.eval)
+      return val._symmath_eval(self._eval)
     return self.simplify(val).scalar()
 
   def equate(self, a, b):
@@ -114,34 +276,392 @@ class System:
       1.5
 
     """
+    start = time.perf_counter()
+    try:
+      if self.tracer is None:
+        self._unpack(a, b)
+      else:
+        with self._trace('equate', pivots=[], facts_touched=0):
+          self._unpack(a, b)
+    finally:
+      self.stats.equate_time += time.perf_counter() - start
+
+  @contextlib.contextmanager
+  def _trace(self, name, **args):
+    outer = self._trace_args
+    try:
+      with self.tracer.span(name, cat='symmath', **args) as self._trace_args:
+        yield
+    finally:
+      self._trace_args = outer
+
+  def _unpack(self, a, b):
     if hasattr(a, '_symmath_equate'):
-      a._symmath_equate(self.equate, b)
+      a._symmath_equate(self._unpack, b)
       return
     if hasattr(b, '_symmath_equate'):
-      b._symmath_equate(self.equate, a)
+      b._symmath_equate(self._unpack, a)
       return
     if isinstance(a, abc.Iterable) and isinstance(b, abc.Iterable):
       for x, y in zip(a, b):
-        self.equate(x, y)
+        self._unpack(x, y)
       return
-    expr = self.simplify(a - b)
-    if expr == 0:
+    self.stats.equations += 1
+    self._equate(a - b)
+
+  def solve(self):
+    """
+
+    Solve all recorded :attr:`equations` and add the results to :attr:`facts`.
+    This does nothing unless the system is deferred. There is no need to call
+    this method before :func:`eval` or :func:`simplify`.
+
+    The equations are solved in a good order rather than the order they were
+    recorded: First the trivial equations of the form *x = c* and *x = y + c*
+    are eliminated. The remaining equations are then simplified, redundant
+    equations are dropped, and the rest are eliminated shortest first.
+
+    If the equations turn out to be over-constrained, the facts found before
+    the contradiction are kept, like in a system which is not deferred, and
+    the equations which were not solved (including the contradicting one) are
+    put back in :attr:`equations` before the exception is raised.
+
+    .. doctest::
+
+      >>> x = sym('x')
+      >>> y = sym('y')
+      >>> system = System(deferred=True)
+      >>> system.equate(x + y, 3)
+      >>> system.equate(x, 2)
+      >>> system.facts
+      {}
+      >>> system.solve()
+      >>> sorted(system.facts)
+      ['x', 'y']
+      >>> system.eval(y)
+      1.0
+
+    """
+    equations, self.equations = self.equations, []
+    if equations:
+      if self._journal is not None:
+        self._journal.append((None, equations))
+      start = time.perf_counter()
+      try:
+        if self.tracer is None:
+          self._solve(equations)
+        else:
+          with self._trace('solve', equations=len(equations),
+                           facts_touched=0):
+            self._solve(equations)
+      except SymmathError:
+        # The solved equations are implied by the facts, so only the others
+        # are kept.
+        self.equations = [
+            expr for expr in equations if not self.simplify(expr).is_zero()
+        ] + self.equations
+        raise
+      finally:
+        self.stats.solve_time += time.perf_counter() - start
+
+  def components(self, equations=None):
+    """
+
+    Split *equations* (by default the recorded :attr:`equations`) into groups
+    which share no symbols, apart from :attr:`parameters`. The groups can be
+    solved independently of each other; e.g. the horizontal and vertical
+    constraints of a layout usually form separate components. Equations
+    without any symbols are put in a group of their own.
+
+    .. doctest::
+
+      >>> x, y, z = sym('x'), sym('y'), sym('z')
+      >>> system = System(deferred=True)
+      >>> system.equate(x, y + 1)
+      >>> system.equate(z, 2)
+      >>> system.equate(2 * y, x)
+      >>> [len(group) for group in system.components()]
+      [2, 1]
+
+    """
+    if equations is None:
+      equations = self.equations
+    parameters = self.parameters
+    parent = {}
+
+    def find(s):
+      root = parent.setdefault(s, s)
+      while root != parent[root]:
+        parent[root] = parent[parent[root]]
+        root = parent[root]
+      return root
+
+    firsts = []
+    for expr in equations:
+      first = None
+      for s in expr.terms:
+        if s is None or s in parameters:
+          continue
+        if first is None:
+          first = find(s)
+        else:
+          root = find(s)
+          if root != first:
+            parent[root] = first
+      firsts.append(first)
+    groups = {}
+    for expr, first in zip(equations, firsts):
+      key = first if first is None else find(first)
+      groups.setdefault(key, []).append(expr)
+    return list(groups.values())
+
+  def _solve(self, equations):
+    if self.workers is not None:
+      if self.facts:
+        equations = [self.simplify(expr) for expr in equations]
+      groups = self.components(equations)
+      large = [g for g in groups if len(g) >= self.parallel_threshold]
+      if len(large) > 1:
+        self._solve_parallel(large)
+        for group in groups:
+          if len(group) < self.parallel_threshold:
+            self._solve_component(group)
+        return
+    self._solve_component(equations)
+
+  def _solve_parallel(self, groups):
+    """
+    Solve each of *groups* in a new :class:`System` in a worker process, and
+    add the resulting facts to this system.
+    """
+    import concurrent.futures
+    workers = self.workers
+    if isinstance(workers, concurrent.futures.Executor):
+      results = list(workers.map(
+          _solve_group, groups, [self.parameters] * len(groups),
+          [self.pivot] * len(groups)))
+    else:
+      with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        results = list(executor.map(
+            _solve_group, groups, [self.parameters] * len(groups),
+            [self.pivot] * len(groups)))
+    for facts in results:
+      # The facts of a component only mention its own free symbols, which
+      # are not eliminated here, so they can be added in any order.
+      for symbol, expr in facts.items():
+        self._add_fact(symbol, expr)
+
+  def _solve_component(self, equations):
+    trivial = []
+    general = []
+    for expr in equations:
+      coefs = [c for s, c in expr.terms.items() if s is not None]
+      if len(coefs) <= 1 or (len(coefs) == 2 and coefs[0] == -coefs[1] and
+                             abs(coefs[0]) == 1):
+        trivial.append((len(coefs), expr))
+      else:
+        general.append(expr)
+    trivial.sort(key=lambda x: x[0])
+    for _, expr in trivial:
+      self._eliminate(expr)
+    general = [self.simplify(expr) for expr in general]
+    general.sort(key=lambda x: len(x.terms))
+    for expr in general:
+      self._eliminate(expr)
+
+  def _equate(self, expr):
+    """
+    Add the equation *expr = 0*. Subclasses override this to change how
+    equations are processed; :func:`equate` only handles the unpacking of
+    structured arguments.
+    """
+    if self.deferred:
+      self.equations.append(Expr(expr))
+    else:
+      self._eliminate(expr)
+
+  def _eliminate(self, expr):
+    expr = self.simplify(expr)
+    if expr.is_zero():
+      self.stats.redundant += 1
       return
     # We now have an equation
     #
     #   0 = c_1 x_1 + c_2 x_2 + ...
     #
-    # where {x_1, x_2, ... } are symbols. We find the pair (x_i, c_i) where c_i
-    # is maximal, as this will lead to the smallest round-off errors later.
-    terms = [(k, v) for k, v in expr.terms.items() if k is not None]
+    # where {x_1, x_2, ... } are symbols, and pick a pair (x_i, c_i) to
+    # eliminate.
+    parameters = self.parameters
+    terms = [(k, v) for k, v in expr.terms.items()
+             if k is not None and k not in parameters]
     if not terms:
       raise SymmathError('System is over-constrained')
-    symbol, coef = max(terms, key=lambda x: x[1])
+    if len(terms) == 2 and abs(terms[0][1]) == 1 and \
+       terms[0][1] == -terms[1][1]:
+      # Offset equations x_1 = x_2 + c are by far the most common. The facts
+      # form a weighted union-find: every eliminated symbol is a free symbol
+      # (the root of its class) plus an offset. We merge the smaller class
+      # into the larger one, so a symbol is rewritten O(log n) times at most.
+      symbol, coef = min(
+          terms, key=lambda x: len(self.occurrences.get(x[0], ())))
+    elif self.pivot == 'markowitz':
+      # Substituting x_i into the facts containing it adds up to len(terms)
+      # terms to each of them, so we prefer rare symbols. Coefficients much
+      # smaller than the largest one are rejected to keep the elimination
+      # numerically stable (threshold pivoting).
+      occurrences = self.occurrences
+      threshold = 0.1 * max(abs(c) for _, c in terms)
+      symbol, coef = min(
+          (x for x in terms if abs(x[1]) >= threshold),
+          key=lambda x: (len(occurrences.get(x[0], ())), -abs(x[1])))
+    elif self.pivot == 'abs':
+      # The largest |c_i| leads to the smallest round-off errors later.
+      symbol, coef = max(terms, key=lambda x: abs(x[1]))
+    else:
+      symbol, coef = max(terms, key=lambda x: x[1])
     # We now rearrange x_i = (c_1 x_1 + c_2 x_2 + ...) / c_i
     expr[symbol] = 0
     expr /= - coef
-    # and substitue this into all the old facts to eliminate x_i.
-    for subs in self.facts.values():
+    self._add_fact(symbol, expr)
+
+  def _add_fact(self, symbol, expr):
+    """
+    Substitute *symbol = expr* into the old facts mentioning *symbol* to
+    eliminate it, and then add it as a fact. *expr* must already be simplified.
+    """
+    journal = self._journal
+    keys = self.occurrences.pop(symbol, ())
+    fill_in = 0
+    for key in keys:
+      subs = self.facts[key]
+      if journal is not None:
+        journal.append((key, Expr(subs)))
+      size = len(subs.terms)
       subs.substitue(symbol, expr)
-    # finally add x_i as a fact
+      fill_in += len(subs.terms) - size + 1
+      self._index(key, subs, expr.terms)
+    if journal is not None:
+      journal.append((symbol, None))
     self.facts[symbol] = expr
+    self._index(symbol, expr, expr.terms)
+    if self._trace_args is not None:
+      args = self._trace_args
+      args['facts_touched'] += len(keys)
+      if 'pivots' in args:
+        args['pivots'].append(symbol)
+    stats = self.stats
+    stats.eliminations += 1
+    stats.substitutions += len(keys)
+    stats.fill_in += fill_in
+    if fill_in > stats.max_fill_in:
+      stats.max_fill_in = fill_in
+
+  def _index(self, key, fact, symbols):
+    """
+    Update :attr:`occurrences` for the fact stored under *key*, checking only
+    the given *symbols* (the ones that may have been introduced or cancelled).
+    """
+    for s in symbols:
+      if s is None:
+        continue
+      if s in fact.terms:
+        self.occurrences.setdefault(s, set()).add(key)
+      else:
+        keys = self.occurrences.get(s)
+        if keys is not None:
+          keys.discard(key)
+          if not keys:
+            del self.occurrences[s]
+
+  def checkpoint(self):
+    """
+
+    Start recording changes to the system, so they can later be undone by
+    :func:`rollback`. Only the changes are recorded, so rolling back costs time
+    proportional to the number of facts touched since the checkpoint.
+    Checkpoints can be nested, every :func:`checkpoint` must be matched by
+    either :func:`rollback` or :func:`commit`.
+
+    .. doctest::
+
+      >>> x = sym('x')
+      >>> y = sym('y')
+      >>> system = System()
+      >>> system.equate(x, 2 * y)
+      >>> system.checkpoint()
+      >>> system.equate(y, 1)
+      >>> system.eval(x)
+      2.0
+      >>> system.rollback()
+      >>> system.simplify(x)
+      Expr(2.0 y)
+
+    """
+    if self._journal is None:
+      self._journal = []
+    self._checkpoints.append((len(self._journal), len(self.equations)))
+
+  def rollback(self):
+    """
+    Undo all changes made since the latest :func:`checkpoint`.
+    """
+    position, num_equations = self._checkpoints.pop()
+    journal = self._journal
+    while len(journal) > position:
+      key, old = journal.pop()
+      if key is None:
+        self.equations = old
+        continue
+      current = self.facts.pop(key)
+      self._index(key, Expr(), current.terms)
+      if old is not None:
+        self.facts[key] = old
+        self._index(key, old, old.terms)
+    del self.equations[num_equations:]
+    if not self._checkpoints:
+      self._journal = None
+
+  def commit(self):
+    """
+    Keep the changes made since the latest :func:`checkpoint`. They can still
+    be undone by rolling back an enclosing checkpoint.
+    """
+    self._checkpoints.pop()
+    if not self._checkpoints:
+      self._journal = None
+
+  @contextlib.contextmanager
+  def transaction(self):
+    """
+
+    Context manager which makes a :func:`checkpoint`, and commits the changes
+    if the block succeeds, or rolls them back if it raises an exception.
+
+    .. doctest::
+
+      >>> x = sym('x')
+      >>> system = System()
+      >>> system.equate(x, 1)
+      >>> try:
+      ...   with system.transaction():
+      ...     system.equate(x, 2)
+      ... except SymmathError:
+      ...   pass
+      >>> system.eval(x)
+      1.0
+
+    """
+    self.checkpoint()
+    try:
+      yield self
+    except BaseException:
+      self.rollback()
+      raise
+    self.commit()
+
+
+def _solve_group(equations, parameters, pivot):
+  system = System(pivot=pivot)
+  system.parameters = set(parameters)
+  system._solve_component(equations)
+  return system.facts
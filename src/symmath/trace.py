@@ -0,0 +1,94 @@
+"""
+symmath.trace
+-------------
+
+.. doctest::
+  :hide:
+
+  >>> from symmath import *
+
+.. autoclass:: Tracer
+  :members:
+
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+__all__ = ['Tracer']
+
+
+class Tracer:
+  """
+
+  Records timed spans in the Chrome trace event format, which can be viewed
+  in ``chrome://tracing`` or https://ui.perfetto.dev.
+
+  Set the :attr:`~symmath.system.System.tracer` attribute of a
+  :class:`~symmath.system.System` (or the
+  :attr:`~boxes.context.Context.tracer` of a
+  :class:`~boxes.context.Context`) to a tracer to record every call to
+  :func:`~symmath.system.System.equate` and :func:`~symmath.system.System.solve`.
+  Tracing is off by default and costs nothing when disabled.
+
+  >>> x = sym('x')
+  >>> y = sym('y')
+  >>> system = System()
+  >>> system.tracer = Tracer()
+  >>> system.equate(x, 2 * y)
+  >>> system.equate(y, 1)
+  >>> [e['name'] for e in system.tracer.events]
+  ['equate', 'equate']
+  >>> system.tracer.events[1]['args']
+  {'pivots': ['y'], 'facts_touched': 1}
+
+  .. attribute:: events
+
+    The list of recorded events. Each event is a dictionary as described by
+    the trace event format.
+
+  """
+
+  def __init__(self):
+    self.events = []
+    self._origin = time.perf_counter()
+    self._pid = os.getpid()
+
+  @contextlib.contextmanager
+  def span(self, name, cat='', **args):
+    """
+
+    Context manager recording a span covering the body of the ``with``
+    statement. Keyword arguments are stored as the arguments of the event. The
+    argument dictionary is returned, so more arguments can be added in the
+    body.
+
+    """
+    start = time.perf_counter()
+    try:
+      yield args
+    finally:
+      end = time.perf_counter()
+      self.events.append({
+          'name': name,
+          'cat': cat,
+          'ph': 'X',
+          'ts': (start - self._origin) * 1e6,
+          'dur': (end - start) * 1e6,
+          'pid': self._pid,
+          'tid': threading.get_ident(),
+          'args': args,
+      })
+
+  def write(self, file):
+    """
+    Write the events as JSON to *file*, which is either a filename or a file
+    object.
+    """
+    if isinstance(file, str):
+      with open(file, 'w') as f:
+        self.write(f)
+      return
+    json.dump({'traceEvents': self.events}, file, default=str)
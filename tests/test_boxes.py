@@ -0,0 +1,300 @@
+from boxes import *
+from boxes.context import UnderdeterminedError
+from symmath import FactorCache, SparseSystem, SymmathError
+
+
+def near(x, y):
+  return abs(x - y) < 1e-7
+
+
+def test_solved_values():
+  ctx = Context()
+  a = ctx.box(size=(2, 1))
+  b = ctx.box(size=(3, 1))
+  fig = constrain.row(a, b, spacing=0.5)
+  fig.solve()
+  assert len(ctx.values) == ctx.num_symbols
+  assert a.rect is a.rect
+  assert near(b.left, 2.5)
+  assert near(fig.width, 5.5)
+  assert near(ctx.eval(b.rect).right, ctx.system.eval(b.rect).right)
+
+
+def test_rect():
+  import pickle
+  from boxes.cartesian import Rect
+  r = Rect(1, 4, 3, 2)
+  assert r.width == 2 and r.height == 2
+  assert r.loc is r.loc
+  assert r.size is r.size
+  assert r.size == (2, 2)
+  for f in [lambda: setattr(r, 'top', 0), lambda: setattr(r, 'width', 0),
+            lambda: delattr(r, 'left')]:
+    try:
+      f()
+    except TypeError:
+      pass
+    else:
+      assert False
+  copy = pickle.loads(pickle.dumps(r))
+  assert (copy.top, copy.right, copy.bottom, copy.left) == (1, 4, 3, 2)
+  assert copy.loc == (2, 1)
+
+
+def test_transaction():
+  ctx = Context()
+  a = ctx.box(size=(2, 1))
+  try:
+    with ctx.transaction():
+      ctx.equate(a.width, 3)
+  except Exception:
+    pass
+  a.solve()
+  assert near(a.width, 2)
+
+
+def test_underdetermined():
+  ctx = Context()
+  a = ctx.box(size=(2, 1))
+  bars = ctx.boxes(2, width=1, height=1)
+  ctx.equate(a.loc, (0, 0))
+  ctx.equate(bars[0].loc, (0, 0))
+  try:
+    ctx.solve()
+  except UnderdeterminedError as e:
+    assert sorted(edge for _, _, edge in e.free) == ['left', 'top']
+    assert all(box is bars[1] for _, box, _ in e.free)
+    assert 'box array 1[1]' in str(e)
+  else:
+    assert False
+  ctx.equate(bars[1].loc, (1, 0))
+  ctx.solve()
+  assert ctx.free_symbols() == []
+
+
+def test_sparse_near_singular():
+  # The terms of the last constraint cancel (f.width = a.width + b.width), but
+  # round-off leaves tiny coefficients which must not be divided by.
+  for c, error in [(1, 'over-constrained'), (0, 'not fully determined')]:
+    ctx = Context(system=SparseSystem())
+    a = ctx.box(aspect=0.3)
+    b = ctx.box(aspect=0.7)
+    f = constrain.row(a, b)
+    ctx.equate(f.loc, (0, 0))
+    ctx.equate(0.1 * a.width + 0.3 * b.width, 0.1 * f.width + 0.2 * b.width + c)
+    try:
+      ctx.solve()
+    except SymmathError as e:
+      assert error in str(e)
+    else:
+      assert False
+
+
+def test_compile():
+  ctx = Context()
+  width, spacing = ctx.param(), ctx.param()
+  fig = ctx.box(width=width)
+  a = ctx.box(aspect=1)
+  b = ctx.box(aspect=2)
+  fig.fix(constrain.row(a, b, spacing=spacing))
+  ctx.equate(fig.loc, (0, 0))
+  layout = ctx.compile([a.rect, b.rect, fig.height])
+  ra, rb, h = layout([[3.5, 0.5], [7, 1]])
+  assert near(ra.width[0], 1) and near(ra.width[1], 2)
+  assert near(rb.left[1], 3)
+  assert near(h[0], 1)
+  values = ctx.compile()([3.5, 0.5])
+  assert values.shape == (ctx.num_symbols,)
+
+
+def test_grid():
+  ctx = Context()
+  cells = [[ctx.box(width=j + 1, height=i + 1) if (i, j) != (1, 1) else None
+            for j in range(3)] for i in range(2)]
+  table = constrain.grid(cells, row_spacing=0.5, column_spacing=1)
+  table.solve()
+  assert near(table.width, 1 + 2 + 3 + 2)
+  assert near(table.height, 1 + 2 + 0.5)
+  assert near(cells[1][2].left, 1 + 2 + 2)
+  assert near(cells[1][0].top, 1.5)
+
+
+def test_factor_cache():
+  cache = FactorCache()
+  for spacing in [0.5, 1, 2]:
+    ctx = Context(cache=cache)
+    a = ctx.box(size=(2, 1))
+    b = ctx.box(size=(3, 1))
+    fig = constrain.row(a, b, spacing=spacing)
+    fig.solve()
+    assert near(fig.width, 5 + spacing)
+  assert (cache.hits, cache.misses) == (2, 1)
+
+  cache.clear()
+  contexts = [Context(cache=cache) for _ in range(3)]
+  for spacing, ctx in enumerate(contexts):
+    fig = constrain.row(
+        ctx.box(size=(2, 1)), ctx.box(size=(3, 1)), spacing=spacing)
+    ctx.equate(fig.loc, (0, 0))
+  solve_many(contexts, workers=1)
+  assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_box_array():
+  ctx = Context()
+  arr = ctx.boxes(4, size=[(1, 1), (2, 1), (3, 1), (4, 1)], top=0)
+  arr.hcat(spacing=[0, 1, 2])
+  ctx.equate(arr[0].left, 0)
+  ctx.solve()
+  assert list(arr.left) == [0, 1, 4, 9]
+  assert list(arr.width) == [1, 2, 3, 4]
+  assert near(arr[-1].right, 13)
+  assert [box.width for box in arr[1:3]] == [2, 3]
+  try:
+    arr.left[0] = 5
+  except ValueError:
+    pass
+  else:
+    assert False
+
+  ctx = Context()
+  arr = ctx.boxes(3, aspect=2, height=[1, 2, 3], loc=(0, 0))
+  ctx.solve()
+  assert list(arr.width) == [2, 4, 6]
+
+  empty = ctx.boxes(0, size=(1, 1))
+  empty.align('tb')
+  empty.hcat()
+  assert len(empty.left) == 0
+
+
+def test_store(tmp_path):
+  from boxes.store import save, load
+  ctx = Context()
+  arr = ctx.boxes(3, size=(1, 2), top=0)
+  arr.hcat(spacing=1)
+  ctx.equate(arr[0].left, 0)
+  fig = ctx.box(rect=arr[0].rect).surround(1)
+  ctx.solve()
+  save(str(tmp_path / 'a.boxes'), ctx, [arr, fig])
+  layout = load(str(tmp_path / 'a.boxes'))
+  assert len(layout) == 4
+  assert list(layout.left) == [0, 2, 4, -1]
+  assert list(layout.height) == [2, 2, 2, 4]
+
+  ctx = Context()
+  width = ctx.param()
+  box = ctx.box(width=width, height=2 * width, loc=(0, 0))
+  save(str(tmp_path / 'b.boxes'), ctx,
+       compiled=ctx.compile([box.rect.width, box.rect.height]))
+  layout = load(str(tmp_path / 'b.boxes'))
+  assert layout.values is None
+  assert layout.compiled([3]) == [3, 6]
+
+  save(str(tmp_path / 'c.boxes'), ctx, compiled=ctx.compile(box.rect))
+  rect = load(str(tmp_path / 'c.boxes')).compiled([2])
+  assert rect.size == (2, 4)
+
+
+def test_svg(tmp_path):
+  import xml.etree.ElementTree as ET
+  from boxes import svg
+  ctx = Context()
+  a = ctx.box(size=(1, 1))
+  a.annotation = 'a < b'
+  bars = ctx.boxes(3, size=(1, 1))
+  bars.hcat(spacing=0.5)
+  bars.align('tb')
+  constrain.row(a, bars[0], spacing=1)
+  fig = ctx.box(size=(6, 1))
+  ctx.equate(fig.loc, a.loc)
+  filename = str(tmp_path / 'figure.svg')
+  fig.solve()
+  svg.write(filename, fig, [a, bars])
+  ns = '{http://www.w3.org/2000/svg}'
+  root = ET.parse(filename).getroot()
+  assert root.get('width') == str(6 * 30 + 1)
+  rects = root.findall('.//' + ns + 'rect')
+  assert len(rects) == 5
+  assert float(rects[3].get('x')) == 0.5 + 3.5 * 30
+  assert root.find('.//' + ns + 'text').text == 'a < b'
+
+
+def test_raster():
+  from boxes.display import raster
+  ctx = Context()
+  fig = ctx.box(size=(4, 2))
+  inner = fig.pad(0.5, 1)
+  image = raster(fig, [inner], dots_per_unit=10)
+  assert image.shape == (21, 41, 4)
+  assert list(image[10, 20]) == [185, 128, 41, 255]
+  assert list(image[2, 2]) == [255, 204, 179, 255]
+
+  ctx = Context()
+  bars = ctx.boxes(2, size=(1, 1), top=0)
+  bars.hcat(spacing=2)
+  fig = ctx.box(size=(4, 1))
+  ctx.equate(fig.loc, bars[0].loc)
+  image = raster(fig, [bars], dots_per_unit=10)
+  assert list(image[5, 5]) == [185, 128, 41, 255]
+  assert list(image[5, 20]) == [255, 204, 179, 255]
+  assert list(image[5, 35]) == [185, 128, 41, 255]
+
+
+def test_spatial_index():
+  from boxes.cartesian import Rect
+  from boxes.index import SpatialIndex
+  ctx = Context()
+  grid = ctx.boxes(100, size=(1, 1))
+  for i in range(100):
+    ctx.equate(grid[i].loc, (i % 10 * 2, i // 10 * 2))
+  extra = ctx.box(size=(3, 3))
+  ctx.equate(extra.loc, (0.5, 0.5))
+  ctx.solve()
+  index = SpatialIndex(ctx, [grid, extra])
+  assert len(index) == 101
+  assert set(index.containing((0.75, 0.75))) == {grid[0], extra}
+  assert index.containing((1.5, 5)) == []
+  found = index.intersecting(Rect(3.5, 7.5, 5.5, 4.5))
+  assert set(found) == {grid[22], grid[23]}
+  assert index.nearest((30, 30)) is grid[99]
+  with ctx.transaction():
+    ctx.equate(grid[0].loc, (0, 0))
+    ctx.solve()
+  assert index.nearest((-5, -5)) is grid[0]
+
+
+def test_solve_many():
+  contexts = [Context(deferred=True) for _ in range(5)]
+  contexts.append(Context(system=SparseSystem()))
+  figures = []
+  for i, ctx in enumerate(contexts):
+    a = ctx.box(size=(1, i + 1))
+    b = ctx.box(size=(1, 1))
+    fig = constrain.column(a, b, spacing=0.5)
+    ctx.equate(fig.loc, (0, 0))
+    figures.append((fig, b))
+  solve_many(contexts, workers=2)
+  for i, (fig, b) in enumerate(figures):
+    assert contexts[i].is_solved
+    assert near(fig.height, i + 2.5)
+    assert near(b.top, i + 1.5)
+
+
+def test_fit_text():
+  from boxes.text import Font, TextMetrics, measure
+  metrics = TextMetrics(lambda text, font: (len(text) * font.size, font.size),
+                        maxsize=2)
+  font = Font('Mono', 2)
+  for text in ['a', 'bb', 'a', 'ccc', 'bb']:
+    assert metrics.measure(text, font) == (2 * len(text), 2)
+  assert (metrics.hits, metrics.misses) == (1, 4)
+  ctx = Context()
+  labels = [ctx.box(), ctx.box()]
+  constrain.fit_text('Total', *labels, font=font, padding=0.5)
+  constrain.row(*labels)
+  labels[0].solve()
+  width, height = measure('Total', font)
+  assert near(labels[1].right, 2 * width + 2)
+  assert near(labels[1].height, height + 1)
+
@@ -14,3 +14,227 @@ def test_solve():
   assert near(sys.eval(x), 3)
   assert near(sys.eval(y), -1)
   assert near(sys.eval(z), 2)
+
+
+def test_occurrences():
+  sys = System()
+  x, y, z, w = (sym(n) for n in "xyzw")
+  sys.equate(x, y + 1)
+  sys.equate(w, 2 * z)
+  sys.equate(y, z)
+  for symbol, keys in sys.occurrences.items():
+    assert keys == {k for k, v in sys.facts.items() if symbol in v.terms}
+  assert sys.occurrences == {'z': {'x', 'y', 'w'}}
+
+
+def test_sparse_solve():
+  sys = SparseSystem()
+  x, y, z = (sym(n) for n in "xyz")
+  sys.equate(x + y, z)
+  sys.equate(x - y, 2 * z)
+  sys.equate(x + y + z, 4)
+  assert near(sys.eval(x), 3)
+  assert near(sys.eval(y), -1)
+  assert near(sys.eval(z), 2)
+
+
+def test_sparse_fallback():
+  sys = SparseSystem()
+  x, y = sym('x'), sym('y')
+  sys.equate(x, 2 * y)
+  assert sys.simplify(x) == 2 * y
+  sys.equate(x, 2 * y)
+  sys.equate(y, 1)
+  assert near(sys.eval(x), 2)
+
+
+def test_sparse_rank_deficient():
+  # x + y + z = 1 and x - y = 2 imply the last equation, so z is free.
+  sys = SparseSystem()
+  x, y, z = (sym(n) for n in "xyz")
+  sys.equate(x + y + z, 1)
+  sys.equate(x - y, 2)
+  sys.equate(2 * x + z, 3)
+  sys.solve()
+  assert len(sys.facts) == 2
+  sys.equate(z, 1)
+  assert near(sys.eval(x), 1)
+  assert near(sys.eval(y), -1)
+
+
+def test_deferred():
+  sys = System(deferred=True)
+  x, y, z = (sym(n) for n in "xyz")
+  sys.equate(x + y, z)
+  sys.equate(x - y, 2 * z)
+  sys.equate(x + y + z, 4)
+  sys.equate(2 * x + 2 * y, 2 * z)
+  assert len(sys.equations) == 4
+  sys.solve()
+  assert sys.equations == []
+  assert near(sys.eval(x), 3)
+  assert near(sys.eval(y), -1)
+  assert near(sys.eval(z), 2)
+
+
+def test_deferred_over_constrained():
+  x, y = sym('x'), sym('y')
+  for sys in [System(deferred=True), SparseSystem()]:
+    sys.equate(x, 1)
+    sys.equate(x, 2)
+    sys.equate(y, 3)
+    try:
+      sys.solve()
+    except SymmathError:
+      pass
+    else:
+      assert False
+    # The sparse engine solves all equations at once, so it keeps them all.
+    assert x - 2 in sys.equations and y - 3 in sys.equations
+    sys.equations.remove(x - 2)
+    assert near(sys.eval(x), 1)
+    assert near(sys.eval(y), 3)
+
+
+def test_components():
+  sys = System(deferred=True, workers=2)
+  sys.parallel_threshold = 3
+  xs = [sym(n) for n in range(10)]
+  sys.equate(xs[9], 1)
+  sys.equate(xs[0], 2 * xs[9])
+  for i in range(1, 4):
+    sys.equate(xs[i], xs[i - 1] + 1)
+  for i in range(5, 8):
+    sys.equate(xs[i], 2 * xs[i - 1])
+  sys.equate(xs[4], 1)
+  sys.solve()
+  assert near(sys.eval(xs[3]), 5)
+  assert near(sys.eval(xs[7]), 8)
+  assert len(sys.facts) == 9
+
+
+def test_markowitz():
+  x, y, z, w = (sym(n) for n in "xyzw")
+  systems = [System(pivot=pivot) for pivot in System.pivots]
+  for sys in systems:
+    sys.equate(x, 3 * w + y)
+    sys.equate(z, 2 * w)
+    sys.equate(2 * w + y + 3 * z, 1)
+    sys.equate(x + y, 4 * w - 2)
+    assert all(near(sys.eval(s), systems[0].eval(s)) for s in (x, y, z, w))
+  try:
+    System(pivot='smallest')
+  except ValueError:
+    pass
+  else:
+    assert False
+
+
+def test_solve_systems():
+  x, y = sym('x'), sym('y')
+  good = System(deferred=True)
+  good.equate(x, 1)
+  good.checkpoint()
+  good.equate(x + y, 3)
+  bad = System(deferred=True)
+  bad.equate(x, 1)
+  bad.equate(x, 2)
+  try:
+    solve_systems([good, bad], workers=1)
+  except SymmathError:
+    pass
+  else:
+    assert False
+  assert len(bad.equations) == 2
+  solve_systems([good], workers=1)
+  assert good.equations == []
+  assert near(good.eval(y), 2)
+  good.rollback()
+  assert len(good.equations) == 1
+
+
+def test_offset_chain():
+  sys = System()
+  xs = [sym(n) for n in range(100)]
+  for a, b in zip(xs[1:], xs[:-1]):
+    sys.equate(a, b + 1)
+  assert all(len(fact.terms) == 2 for fact in sys.facts.values())
+  sys.equate(xs[50], 0)
+  assert near(sys.eval(xs[0]), -50)
+  assert near(sys.eval(xs[99]), 49)
+
+
+def test_rollback():
+  for deferred in (False, True):
+    sys = System(deferred=deferred)
+    x, y, z, w = (sym(n) for n in "xyzw")
+    sys.equate(x, y + z)
+    sys.equate(z, 1)
+    sys.solve()
+    facts = {k: Expr(v) for k, v in sys.facts.items()}
+    occurrences = {k: set(v) for k, v in sys.occurrences.items()}
+    sys.checkpoint()
+    sys.equate(x, 3)
+    sys.checkpoint()
+    sys.equate(w, y + 5)
+    sys.commit()
+    sys.solve()
+    sys.rollback()
+    assert sys.facts == facts
+    assert sys.occurrences == occurrences
+    assert sys.equations == []
+
+
+def test_fused_kernels():
+  x, y = sym('x'), sym('y')
+  e = x + 2 * y + 1
+  e.add_scaled(y, -2)
+  assert e == x + 1
+  assert not e.is_zero() and not e.is_scalar()
+  e.add_scaled(x + 1e-10, -1)
+  assert e.is_scalar() and e.scalar() == 1
+  e -= 1
+  assert e.is_zero() and e == 0
+  e = x + y + 1
+  e += e
+  assert e == 2 * x + 2 * y + 2
+  e -= e
+  assert e.is_zero()
+
+
+def test_tolerance():
+  x = sym('x')
+  assert (x + 1).tolerance == 1e-8
+  e = Expr(1, tolerance=0.1) + 0.05 * x
+  assert e.tolerance == 0.1 and e == 1
+  assert (2 * e).tolerance == 0.1
+
+
+def test_stats():
+  sys = System()
+  x, y, z = (sym(n) for n in "xyz")
+  sys.equate(x, y + z)
+  sys.equate(y, z)
+  sys.equate(2 * x, 4 * z)
+  assert sys.stats.equations == 3
+  assert sys.stats.redundant == 1
+  assert sys.stats.eliminations == 2
+  assert sys.fact_size() == (2, 1)
+  sys.stats.reset()
+  assert sys.stats.as_dict() == dict.fromkeys(Stats.fields, 0)
+
+
+def test_tracer():
+  import io
+  import json
+  sys = System(deferred=True)
+  sys.tracer = Tracer()
+  x, y = sym('x'), sym('y')
+  sys.equate(x, y + 1)
+  sys.equate(y, 2)
+  sys.solve()
+  f = io.StringIO()
+  sys.tracer.write(f)
+  events = json.loads(f.getvalue())['traceEvents']
+  assert [e['name'] for e in events] == ['equate', 'equate', 'solve']
+  assert events[2]['args'] == {'equations': 2, 'facts_touched': 0}